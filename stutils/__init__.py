@@ -1,8 +1,14 @@
-from . import file
-from . import string
-from . import text
-from . import time
-from . import static
-from . import graph
-from . import random
-from . import hash
\ No newline at end of file
+import importlib
+
+# 子包在第一次访问时才导入（PEP 562），避免导入stutils时加载NumPy、SciPy等重量级依赖
+_submodules = ('file', 'string', 'text', 'time', 'static', 'graph', 'random', 'hash')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
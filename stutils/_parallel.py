@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# @Author  : uhauha2929
+# @Email   : ck143302@gmail.com
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator, List
+
+# 进程池中每个子进程持有的计算函数和共享参数，只在初始化时传输一次
+_worker_func = None
+_worker_args = ()
+
+
+def _init_worker(func: Callable, args: tuple):
+    global _worker_func, _worker_args
+    _worker_func, _worker_args = func, args
+
+
+def _call_worker(chunk) -> Any:
+    return _worker_func(chunk, *_worker_args)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """惰性地把可迭代对象切分成长度为size的列表，最后一块可能不足size"""
+    it = iter(iterable)
+    return iter(lambda: list(islice(it, size)), [])
+
+
+def ordered_map(func: Callable, chunks: Iterable, args: tuple = (),
+                workers: int = None) -> Iterator:
+    """按输入顺序逐个产生func(chunk, *args)的结果
+
+    workers不大于1或者只有一块时在当前进程中计算；否则args只在子进程初始化时传输一次，
+    最多同时提交两倍进程数的任务，内存只与块的大小有关
+
+    :param func: 对每一块的计算函数，多进程时必须是可以被pickle的模块级函数
+    :param chunks: 块的可迭代对象，可以是惰性的
+    :param args: 所有块共享的参数
+    :param workers: 进程数，默认在当前进程中计算
+    """
+    chunks = iter(chunks)
+    head = list(islice(chunks, 2))
+    if workers is None or workers <= 1 or len(head) < 2:
+        for chunk in chain(head, chunks):
+            yield func(chunk, *args)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(func, args)) as executor:
+        pending = deque()
+        for chunk in chain(head, chunks):
+            pending.append(executor.submit(_call_worker, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,2 +1,16 @@
+import importlib
+
 from .common import *
-from . import map
\ No newline at end of file
+
+# 子模块在第一次访问时才导入（PEP 562）
+_submodules = ('map', 'minhash', 'simhash')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
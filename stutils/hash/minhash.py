@@ -0,0 +1,202 @@
+import pickle
+import zlib
+from collections import defaultdict
+from typing import List, Union, Hashable, Iterable, Tuple, Set
+
+import numpy as np
+
+from ..text.common import ngrams
+
+# 梅森素数2^61 - 1，哈希值和系数都小于2^32，a * x + b不会超过64位
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _is_empty(signature: np.ndarray) -> bool:
+    """是否为没有任何ngram的文本的签名（全部为最大哈希值）"""
+    return bool(np.all(np.asarray(signature) == _MAX_HASH))
+
+
+def shingle_hashes(text: Union[str, List[str]], n: int = 3) -> np.ndarray:
+    """返回文本的ngram（字符或者单词）集合的32位哈希值"""
+    if len(text) < n:
+        return np.zeros(0, np.uint64)
+    shingles = set(ngrams(text, n))
+    return np.fromiter((zlib.crc32('\x1f'.join(shingle).encode('utf8')) for shingle in shingles),
+                       np.uint64, len(shingles))
+
+
+class MinHash(object):
+
+    def __init__(self, num_perm: int = 128, n: int = 3, seed: int = 1):
+        """MinHash签名生成器
+
+        用num_perm个随机的线性哈希函数模拟排列，签名中相同位置相等的比例即为Jaccard相似度的估计
+        :param num_perm: 排列（哈希函数）个数，即签名长度
+        :param n: ngram的长度，字符串按字符，单词列表按单词
+        :param seed: 随机种子，相同的种子得到的签名才可以比较
+        """
+        self.num_perm = num_perm
+        self.n = n
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, int(_MAX_HASH), num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, int(_MAX_HASH), num_perm, dtype=np.uint64)
+
+    def _min_hash(self, hashes: np.ndarray) -> np.ndarray:
+        """返回每一列哈希值经过各个排列后的值，形状为(len(hashes), num_perm)"""
+        return (hashes[:, None] * self.a + self.b) % _MERSENNE_PRIME & _MAX_HASH
+
+    def signature(self, text: Union[str, List[str]]) -> np.ndarray:
+        """返回单个文本的签名"""
+        return self.signatures([text])[0]
+
+    def signatures(self, texts: Iterable[Union[str, List[str]]],
+                   batch_size: int = 1 << 14) -> np.ndarray:
+        """批量返回文本的签名，形状为(len(texts), num_perm)
+
+        长度小于n的文本（包括空文本）没有ngram，签名全部为最大哈希值，
+        与任何签名的估计相似度都为0，也不会被MinHashLSH当作候选
+        :param texts: 文本集合
+        :param batch_size: 每次一起计算的ngram个数
+        """
+        shingles = [shingle_hashes(text, self.n) for text in texts]
+        result = np.full((len(shingles), self.num_perm), _MAX_HASH, np.uint64)
+        start = 0
+        while start < len(shingles):
+            # 凑够batch_size个ngram一起计算，再按文档分段求最小值
+            end, size = start, 0
+            while end < len(shingles) and (size == 0 or size + len(shingles[end]) <= batch_size):
+                size += len(shingles[end])
+                end += 1
+            lengths = np.array([len(h) for h in shingles[start:end]])
+            non_empty = np.nonzero(lengths)[0]
+            if len(non_empty):
+                values = self._min_hash(np.concatenate(shingles[start:end]))
+                offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))[non_empty]
+                result[start + non_empty] = np.minimum.reduceat(values, offsets, axis=0)
+            start = end
+        return result.astype(np.uint32)
+
+    @staticmethod
+    def jaccard(sig1: np.ndarray, sig2: np.ndarray) -> float:
+        """根据两个签名估计Jaccard相似度，与jaccard_index一致，空文本的相似度为0"""
+        if _is_empty(sig1) or _is_empty(sig2):
+            return 0.0
+        return float(np.mean(sig1 == sig2))
+
+
+def _optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """选择分段数b和每段行数r，使得候选概率曲线(1 - (1 - s^r)^b)的拐点(1/b)^(1/r)接近阈值"""
+    best, best_error = (1, num_perm), float('inf')
+    for b in range(1, num_perm + 1):
+        r = num_perm // b
+        error = abs((1 / b) ** (1 / r) - threshold)
+        if error < best_error:
+            best, best_error = (b, r), error
+    return best
+
+
+class MinHashLSH(object):
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128):
+        """MinHash局部敏感哈希索引
+
+        签名分成b段，每段r行，任意一段完全相同的两个签名成为候选，亚线性时间内找到相似文档
+        :param threshold: Jaccard相似度阈值
+        :param num_perm: 签名长度，需要与MinHash一致
+        """
+        if not 0 < threshold < 1:
+            raise ValueError('Threshold must be in range of (0, 1).')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = _optimal_bands(threshold, num_perm)
+        self.tables = [defaultdict(list) for _ in range(self.bands)]
+        self.signatures = {}
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        signature = np.asarray(signature, np.uint32)
+        if signature.shape != (self.num_perm,):
+            raise ValueError('The signature length must be the same as num_perm.')
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes()
+                for i in range(self.bands)]
+
+    def insert(self, key: Hashable, signature: np.ndarray):
+        """插入一个签名，键已存在则报错
+
+        空文本的签名只记录下来，不放入分段哈希表，不会与任何文本成为候选
+        """
+        if key in self.signatures:
+            raise ValueError(f'Duplicate key: {key}')
+        bands = self._band_keys(signature)
+        self.signatures[key] = np.asarray(signature, np.uint32)
+        if _is_empty(signature):
+            return
+        for table, band in zip(self.tables, bands):
+            table[band].append(key)
+
+    def remove(self, key: Hashable) -> bool:
+        """删除一个签名，返回是否成功"""
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return False
+        if _is_empty(signature):
+            return True
+        for table, band in zip(self.tables, self._band_keys(signature)):
+            bucket = table[band]
+            bucket.remove(key)
+            if not bucket:
+                del table[band]
+        return True
+
+    def query(self, signature: np.ndarray) -> List[Hashable]:
+        """返回可能相似的键（未经验证的候选），空文本的签名没有候选"""
+        bands = self._band_keys(signature)
+        if _is_empty(signature):
+            return []
+        candidates = set()
+        for table, band in zip(self.tables, bands):
+            candidates.update(table.get(band, ()))
+        return list(candidates)
+
+    def find_all_pairs(self, threshold: float = None) -> List[Tuple[Hashable, Hashable, float]]:
+        """找出所有估计的Jaccard相似度不小于阈值的键对
+
+        :param threshold: 相似度阈值，默认为索引的阈值
+        :return: (键1, 键2, 估计的相似度)列表
+        """
+        threshold = self.threshold if threshold is None else threshold
+        seen: Set[Tuple[Hashable, Hashable]] = set()
+        pairs = []
+        for table in self.tables:
+            for bucket in table.values():
+                for i in range(len(bucket)):
+                    for j in range(i + 1, len(bucket)):
+                        k1, k2 = bucket[i], bucket[j]
+                        if (k1, k2) in seen or (k2, k1) in seen:
+                            continue
+                        seen.add((k1, k2))
+                        similarity = MinHash.jaccard(self.signatures[k1], self.signatures[k2])
+                        if similarity >= threshold:
+                            pairs.append((k1, k2, similarity))
+        return pairs
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def save(self, path: str):
+        """保存索引"""
+        with open(path, 'wb') as f:
+            pickle.dump({'threshold': self.threshold,
+                         'num_perm': self.num_perm,
+                         'signatures': self.signatures}, f)
+
+    @classmethod
+    def load(cls, path: str) -> 'MinHashLSH':
+        """加载保存的索引，分段哈希表根据签名重建"""
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        lsh = cls(state['threshold'], state['num_perm'])
+        for key, signature in state['signatures'].items():
+            lsh.insert(key, signature)
+        return lsh
@@ -0,0 +1,100 @@
+import hashlib
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Union, Mapping, Iterable, Hashable, List, Tuple
+
+import numpy as np
+
+from ..string.metric import hamming_dist
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_hash(feature: Union[str, tuple]) -> int:
+    """特征的64位哈希值，ngram元组用不可见字符连接"""
+    if isinstance(feature, tuple):
+        feature = '\x1f'.join(feature)
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf8'), digest_size=8).digest(), 'little')
+
+
+def simhash(features: Union[Mapping[Hashable, float], Iterable[Hashable]]) -> int:
+    """返回64位SimHash指纹
+
+    每个特征的哈希值按位投票，位为1加上权重，为0减去权重，最后大于0的位置为1
+    :param features: 单词或ngram列表（按出现次数加权），或者特征到权重的字典
+    :return: 64位非负整数
+    """
+    if not isinstance(features, Mapping):
+        features = Counter(features)
+    if not features:
+        return 0
+    hashes = np.fromiter((_feature_hash(f) for f in features), '<u8', len(features))
+    weights = np.fromiter(features.values(), np.float64, len(features))
+    # 第i列为各个哈希值的第i位
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    votes = 2 * (weights @ bits) - weights.sum()
+    return int(np.packbits(votes > 0, bitorder='little').view('<u8')[0])
+
+
+class SimHashIndex(object):
+
+    def __init__(self, k: int = 3):
+        """SimHash指纹的汉明距离索引
+
+        64位指纹分成k + 1块，距离不超过k的两个指纹至少有一块完全相同（鸽巢原理），
+        每一块建一张表（相当于把该块置换到最高位的排序表），查询时只需验证同块的指纹
+        :param k: 最大汉明距离
+        """
+        self.k = k
+        n_blocks = k + 1
+        bounds = [64 * i // n_blocks for i in range(n_blocks + 1)]
+        self.blocks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.tables = [defaultdict(list) for _ in self.blocks]
+        self.fingerprints = {}
+
+    def _block_keys(self, fingerprint: int) -> List[int]:
+        return [(fingerprint >> shift) & mask for shift, mask in self.blocks]
+
+    def add(self, key: Hashable, fingerprint: int):
+        """添加指纹，键已存在则报错"""
+        if key in self.fingerprints:
+            raise ValueError(f'Duplicate key: {key}')
+        self.fingerprints[key] = fingerprint
+        for table, block in zip(self.tables, self._block_keys(fingerprint)):
+            table[block].append(key)
+
+    def remove(self, key: Hashable) -> bool:
+        """删除指纹，返回是否成功"""
+        fingerprint = self.fingerprints.pop(key, None)
+        if fingerprint is None:
+            return False
+        for table, block in zip(self.tables, self._block_keys(fingerprint)):
+            bucket = table[block]
+            bucket.remove(key)
+            if not bucket:
+                del table[block]
+        return True
+
+    def query(self, fingerprint: int) -> List[Tuple[Hashable, int]]:
+        """返回汉明距离不超过k的(键, 距离)列表，按距离排序"""
+        seen = set()
+        results = []
+        for table, block in zip(self.tables, self._block_keys(fingerprint)):
+            for key in table.get(block, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                dist = hamming_dist(fingerprint, self.fingerprints[key])
+                if dist <= self.k:
+                    results.append((key, dist))
+        results.sort(key=lambda x: x[1])
+        return results
+
+    def add_if_new(self, key: Hashable, fingerprint: int) -> bool:
+        """流式去重：不存在相近指纹时才添加，返回是否添加"""
+        if self.query(fingerprint):
+            return False
+        self.add(key, fingerprint)
+        return True
+
+    def __len__(self):
+        return len(self.fingerprints)
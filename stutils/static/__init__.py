@@ -1,45 +1,80 @@
 import gzip
-from pathlib import Path
-from typing import List, Set
 import os
+import pickle
+from pathlib import Path
+from typing import Tuple, FrozenSet, Union, Callable
 
 MODULE_DIR = os.path.dirname(__file__)
 
+# 进程内的加载缓存，键为(文件路径, 转换函数)，值为(文件修改时间, 不可变的结果)
+_cache = {}
+
 
-def load_words_by_freq(path: str = None) -> List[str]:
-    """从文件加载按频率由大到小排序的单词"""
+def _resolve(path: Union[str, Path, None], default_name: str) -> Path:
     if path is None:
-        path = Path(f'{MODULE_DIR}/20k.txt.gz')
-    else:
-        path = Path(path)
-    words = []
+        return Path(f'{MODULE_DIR}/{default_name}')
+    return Path(path)
+
+
+def _read_lines(path: Path) -> Tuple[str, ...]:
+    """读取每行一个单词的文件，去掉空行并转成小写，支持.txt、.gz和预解析的.pkl"""
+    if path.suffix == '.pkl':
+        with open(path, 'rb') as f:
+            return tuple(pickle.load(f))
     if path.suffix == '.txt':
         f = open(path, 'rt', encoding='utf8')
     else:
         f = gzip.open(path, 'rt', encoding='utf8')
-    for line in f:
-        line = line.strip()
-        if len(line) > 0:
-            words.append(line.lower())
-    f.close()
-    return words
+    with f:
+        return tuple(line.lower() for line in map(str.strip, f) if len(line) > 0)
+
+
+def _load(path: Path, convert: Callable):
+    key = (str(path.resolve()), convert)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    value = convert(_read_lines(path))
+    _cache[key] = (mtime, value)
+    return value
+
+
+def load_words_by_freq(path: str = None) -> Tuple[str, ...]:
+    """从文件加载按频率由大到小排序的单词
+
+    结果按文件路径和修改时间缓存，重复调用不会再次读取文件
+    """
+    return _load(_resolve(path, '20k.txt.gz'), tuple)
 
 
-def load_stopwords(path: str = None) -> Set[str]:
-    """从文件中加载停用词，每行一个单词"""
+def load_stopwords(path: str = None) -> FrozenSet[str]:
+    """从文件中加载停用词，每行一个单词
+
+    结果按文件路径和修改时间缓存，重复调用不会再次读取文件
+    """
+    return _load(_resolve(path, 'stopwords.txt.gz'), frozenset)
+
+
+def clear_cache(path: str = None):
+    """清除加载缓存，指定路径则只清除该文件的缓存"""
     if path is None:
-        path = Path(f'{MODULE_DIR}/stopwords.txt.gz')
-    else:
-        path = Path(path)
-    stopwords = set()
-    if path.suffix == '.txt':
-        f = open(path, 'rt', encoding='utf8')
-    else:
-        f = gzip.open(path, 'rt', encoding='utf8')
-    for line in f:
-        line = line.strip()
-        if len(line) > 0:
-            stopwords.add(line.lower())
-    f.close()
-    return stopwords
+        _cache.clear()
+        return
+    resolved = str(Path(path).resolve())
+    for key in [key for key in _cache if key[0] == resolved]:
+        del _cache[key]
+
+
+def dump_binary(path: str, binary_path: str = None) -> Path:
+    """将单词文件预解析并保存为.pkl格式，之后加载时不需要解压和逐行处理
 
+    :param path: 单词文件路径
+    :param binary_path: 保存路径，默认将原文件的后缀替换为.pkl
+    :return: 保存的路径
+    """
+    path = Path(path)
+    binary_path = Path(binary_path) if binary_path else path.with_suffix('.pkl')
+    with open(binary_path, 'wb') as f:
+        pickle.dump(_read_lines(path), f, protocol=pickle.HIGHEST_PROTOCOL)
+    return binary_path
@@ -1,13 +1,17 @@
+import importlib
+
 from .common import *
-from . import conversion
-from . import match
-from . import arithmetic
-from . import metric
-from . import palindrome
-from . import validation
-from . import transform
-from . import prefix
-from . import suffix
-from . import anagram
-from . import segment
-from . import fuzzy
+
+# 子模块在第一次访问时才导入（PEP 562）
+_submodules = ('conversion', 'match', 'arithmetic', 'metric', 'palindrome', 'validation',
+               'transform', 'prefix', 'suffix', 'anagram', 'segment', 'fuzzy')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
@@ -2,59 +2,230 @@
 # @Author  : uhauha2929
 # @Email   : ck143302@gmail.com
 import heapq
+import inspect
 import json
 import os
+import tempfile
+from collections import OrderedDict, Counter, defaultdict
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Dict, List, Optional, Iterable, Iterator, Tuple
+
+import numpy as np
 
 from .common import case_func_of
-from .metric import min_edit_dist
+from .metric import min_edit_dist, bounded_edit_dist
 from .transform import one_edit_words
+from .._parallel import chunked, ordered_map
 from ..static import load_words_by_freq
 
 
+def _known_candidates(word: str, n: int, word_rank: Dict[str, int]) -> List[str]:
+    """返回小写单词最可能的n个纠正结果，最多两次编辑"""
+
+    def two_edit_words(w):
+        return {e2 for e1 in one_edit_words(w) for e2 in one_edit_words(e1)}
+
+    def known(words):
+        return {w for w in words if w in word_rank}
+
+    candidates = (known({word}) or
+                  known(one_edit_words(word)) or
+                  known(two_edit_words(word)) or
+                  [word])
+    return heapq.nsmallest(n, candidates, key=word_rank.get)
+
+
+def _correct_words(words: List[str], n: int, word_rank: Dict[str, int]) -> List[List[str]]:
+    return [_known_candidates(word, n, word_rank) for word in words]
+
+
 class Corrector(object):
 
-    def __init__(self, word_freq_file: str = None):
+    def __init__(self, word_freq_file: str = None, cache_size: int = 10000):
+        """拼写检查器
+
+        :param word_freq_file: 词频文件，默认使用内置词表
+        :param cache_size: 纠正结果的LRU缓存大小，0表示不缓存
+        """
         self.word_rank = {w: i + 1 for i, w in
                           enumerate(load_words_by_freq(word_freq_file))}
+        self.cache_size = cache_size
+        # 键为小写单词，值为(计算时的n, 候选列表)
+        self._cache = OrderedDict()
 
-    # 拼写检查器
-    def correct(self, word: str, n: int = 5):
-        """找出最可能拼错的词，最多两次编辑"""
+    def _cache_get(self, word: str, n: int) -> Optional[List[str]]:
+        entry = self._cache.get(word)
+        if entry is None:
+            return None
+        cached_n, candidates = entry
+        # 单词的排名各不相同，较大n的结果截取前缀即为较小n的结果
+        if cached_n < n and len(candidates) == cached_n:
+            return None
+        self._cache.move_to_end(word)
+        return candidates[:n]
 
-        def two_edit_words(w):
-            return {e2 for e1 in one_edit_words(w) for e2 in one_edit_words(e1)}
+    def _cache_put(self, word: str, n: int, candidates: List[str]):
+        if self.cache_size <= 0:
+            return
+        self._cache[word] = (n, candidates)
+        self._cache.move_to_end(word)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
-        def known(words):
-            return {w for w in words if w in self.word_rank}
+    def clear_cache(self):
+        """清空纠正结果缓存"""
+        self._cache.clear()
 
+    def correct(self, word: str, n: int = 5):
+        """找出最可能拼错的词，最多两次编辑"""
         case_func = case_func_of(word)
         word = word.lower()
-        candidates = (known({word}) or
-                      known(one_edit_words(word)) or
-                      known(two_edit_words(word)) or
-                      [word])
+        candidates = self._cache_get(word, n)
+        if candidates is None:
+            candidates = _known_candidates(word, n, self.word_rank)
+            self._cache_put(word, n, candidates)
+        return list(map(case_func, candidates))
+
+    def correct_many(self, tokens: List[str], n: int = 5,
+                     workers: int = None) -> List[List[str]]:
+        """批量纠正单词，结果与输入顺序一致
 
-        return list(map(case_func,
-                        heapq.nsmallest(n, candidates,
-                                        key=self.word_rank.get)))
+        输入先按小写去重，命中缓存的直接返回，其余分配到进程池中计算
+
+        :param tokens: 单词列表
+        :param n: 每个单词最多返回的候选数
+        :param workers: 进程数，默认在当前进程中计算
+        :return: 每个单词的候选列表
+        """
+        lowered = [token.lower() for token in tokens]
+        results = {}
+        missing = []
+        for word in dict.fromkeys(lowered):
+            candidates = self._cache_get(word, n)
+            if candidates is None:
+                missing.append(word)
+            else:
+                results[word] = candidates
+
+        if missing:
+            chunk_size = max(1, len(missing) // ((workers or 1) * 4))
+            corrected = [candidates for chunk in
+                         ordered_map(_correct_words, chunked(missing, chunk_size),
+                                     (n, self.word_rank), workers)
+                         for candidates in chunk]
+            for word, candidates in zip(missing, corrected):
+                self._cache_put(word, n, candidates)
+                results[word] = candidates
+
+        return [list(map(case_func_of(token), results[word]))
+                for token, word in zip(tokens, lowered)]
 
 
 class BKTree(object):
+    # 二进制文件头：魔数(8字节)、结点数、边数、单词总字节数(各8字节)
+    MAGIC = b'BKTREE01'
+    HEADER_SIZE = 32
+    # 被删除的结点仍然保留在树中，排名标记为-1
+    REMOVED = -1
 
     def __init__(self,
                  dist_fn: Callable[[str, str], int] = min_edit_dist,
                  save_dir: str = None):
         """Burkhard Keller Tree实现
 
-        用于模糊搜索，单词纠错
-        :param dist_fn: 单词距离计算函数，默认最小编辑距离
-        :param save_dir: json文件路径
+        用于模糊搜索，单词纠错。树以扁平数组存储：第i个结点的单词、排名分别为
+        words[i]、ranks[i]，children[i]为{距离: 孩子结点下标}，下标0为根结点
+        :param dist_fn: 单词距离计算函数，默认最小编辑距离，
+                        如果支持max_dist参数，查询时会用它提前结束距离计算
+        :param save_dir: 二进制文件所在目录
         """
         self.dist_fn = dist_fn
+        try:
+            self._bounded = 'max_dist' in inspect.signature(dist_fn).parameters
+        except (TypeError, ValueError):
+            self._bounded = False
         self.save_dir = save_dir or os.path.expanduser('~')
-        self.root = None
+        self.words = []
+        self.ranks = []
+        self.children = []
+        # 从文件加载时为内存映射的数组，直接在其上查询
+        self._arrays = None
+
+    def _size(self) -> int:
+        if self._arrays is not None:
+            return len(self._arrays['ranks'])
+        return len(self.words)
+
+    def _insert(self, word: str, rank: int):
+        if not self.words:
+            self.words.append(word)
+            self.ranks.append(rank)
+            self.children.append({})
+            return
+        i = 0
+        while True:
+            dist = self.dist_fn(self.words[i], word)
+            child = self.children[i].get(dist)
+            if child is None:
+                self.children[i][dist] = len(self.words)
+                self.words.append(word)
+                self.ranks.append(rank)
+                self.children.append({})
+                return
+            i = child
+
+    def _thaw(self):
+        """将内存映射的数组转换成可修改的列表"""
+        if self._arrays is None:
+            return
+        word_of, rank_of, edges, _ = self._accessors()
+        edge_dist = self._arrays['edge_dist']
+        child_ptr = self._arrays['child_ptr']
+        n = self._size()
+        self.words = [word_of(i) for i in range(n)]
+        self.ranks = self._arrays['ranks'].tolist()
+        self.children = [dict(zip(edge_dist[child_ptr[i]:child_ptr[i + 1]].tolist(), edges(i)))
+                         for i in range(n)]
+        self._arrays = None
+
+    def _find(self, word: str) -> int:
+        """返回单词所在结点的下标，不存在返回-1"""
+        i = 0 if self.words else -1
+        while i >= 0:
+            dist = self.dist_fn(self.words[i], word)
+            if dist == 0:
+                return i
+            i = self.children[i].get(dist, -1)
+        return -1
+
+    def add(self, word: str, rank: int = None):
+        """添加单词，已存在则更新排名
+
+        :param word: 单词
+        :param rank: 排名，越小越常用，默认新单词排在最后、已有单词保持原排名
+        """
+        self._thaw()
+        word = word.lower()
+        i = self._find(word)
+        if i < 0:
+            self._insert(word, len(self.words) if rank is None else rank)
+        elif rank is not None:
+            self.ranks[i] = rank
+        elif self.ranks[i] == self.REMOVED:
+            # 删除时原排名已经丢失，恢复后排在最后
+            self.ranks[i] = len(self.words)
+
+    def remove(self, word: str) -> bool:
+        """删除单词，返回是否成功
+
+        结点只做删除标记，仍然参与树的路由
+        """
+        self._thaw()
+        i = self._find(word.lower())
+        if i < 0 or self.ranks[i] == self.REMOVED:
+            return False
+        self.ranks[i] = self.REMOVED
+        return True
 
     def build(self,
               word_freq_file: str = None,
@@ -64,32 +235,133 @@ class BKTree(object):
         :param word_freq_file: 词频文件
         :param save_dir: 保存的地址，默认用户目录
         """
-        save_dir = save_dir or self.save_dir
-        words = load_words_by_freq(word_freq_file)
-
-        def _add(parent, rank, word):
-            p_word, _, children = parent
-            # 为了满足Json格式，key必须为string
-            dist = str(self.dist_fn(p_word, word))
-            if dist in children:
-                _add(children[dist], rank, word)
-            else:
-                children[dist] = (word, rank, {})
+        self.words, self.ranks, self.children = [], [], []
+        self._arrays = None
+        for rank, word in enumerate(load_words_by_freq(word_freq_file)):
+            self._insert(word, rank)
+        self.save(save_dir)
 
-        self.root = (words.pop(0), 0, {})
-        for i, w in enumerate(words):
-            _add(self.root, i + 1, w)
+    def _to_arrays(self) -> Dict[str, np.ndarray]:
+        """转换成紧凑的数组表示，孩子按距离排序后以CSR形式存储"""
+        if self._arrays is not None:
+            return self._arrays
+        encoded = [w.encode('utf8') for w in self.words]
+        word_offsets = np.zeros(len(encoded) + 1, np.int64)
+        np.cumsum([len(b) for b in encoded], out=word_offsets[1:])
+        child_ptr = np.zeros(len(self.children) + 1, np.int64)
+        np.cumsum([len(c) for c in self.children], out=child_ptr[1:])
+        edges = [item for c in self.children for item in sorted(c.items())]
+        return {'word_offsets': word_offsets,
+                'ranks': np.asarray(self.ranks, np.int64),
+                'child_ptr': child_ptr,
+                'edge_dist': np.asarray([d for d, _ in edges], np.int64),
+                'edge_child': np.asarray([c for _, c in edges], np.int64),
+                'blob': np.frombuffer(b''.join(encoded), np.uint8)}
 
-        with open(save_dir + '/bk.json', 'wt') as f:
-            json.dump(self.root, f)
+    def save(self, directory: str = None):
+        """以二进制格式保存树"""
+        path = Path(directory or self.save_dir) / 'bk.bin'
+        arrays = self._to_arrays()
+        header = np.array([len(arrays['ranks']), len(arrays['edge_dist']),
+                           len(arrays['blob'])], '<i8')
+        # 先写临时文件再替换，原文件可能正被内存映射，直接覆盖会截断映射中的数据
+        fd, tmp_path = tempfile.mkstemp(prefix='bk.', suffix='.tmp', dir=path.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.MAGIC)
+                f.write(header.tobytes())
+                for name in ('word_offsets', 'ranks', 'child_ptr', 'edge_dist', 'edge_child'):
+                    f.write(np.ascontiguousarray(arrays[name], '<i8').tobytes())
+                f.write(np.ascontiguousarray(arrays['blob']).tobytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
 
     def load(self, directory: str = None):
-        """加载自定义的json文件"""
-        path = Path(directory or self.save_dir) / "bk.json"
-        if not path.exists() or path.suffix != '.json':
-            raise FileNotFoundError('Tree json file not found.')
+        """以内存映射的方式加载二进制文件，兼容旧版的json文件"""
+        directory = Path(directory or self.save_dir)
+        path = directory / 'bk.bin'
+        if not path.exists():
+            if (directory / 'bk.json').exists():
+                self._load_json(directory / 'bk.json')
+                return
+            raise FileNotFoundError('Tree file not found.')
+        buffer = np.memmap(path, np.uint8, mode='r')
+        if bytes(buffer[:8]) != self.MAGIC:
+            raise ValueError('Invalid tree file.')
+        n_nodes, n_edges, n_bytes = buffer[8:self.HEADER_SIZE].view('<i8').tolist()
+        arrays = {}
+        offset = self.HEADER_SIZE
+        for name, length in (('word_offsets', n_nodes + 1), ('ranks', n_nodes),
+                             ('child_ptr', n_nodes + 1), ('edge_dist', n_edges),
+                             ('edge_child', n_edges)):
+            arrays[name] = buffer[offset:offset + 8 * length].view('<i8')
+            offset += 8 * length
+        arrays['blob'] = buffer[offset:offset + n_bytes]
+        self.words, self.ranks, self.children = [], [], []
+        self._arrays = arrays
+
+    def _load_json(self, path: Path):
         with open(path, 'rt', encoding='utf8') as f:
-            self.root = json.load(f)
+            root = json.load(f)
+        self.words, self.ranks, self.children = [], [], []
+        self._arrays = None
+        stack = [(root, None, None)]
+        while stack:
+            (word, rank, children), parent, dist = stack.pop()
+            if parent is not None:
+                self.children[parent][dist] = len(self.words)
+            index = len(self.words)
+            self.words.append(word)
+            self.ranks.append(rank)
+            self.children.append({})
+            stack.extend((child, index, int(d)) for d, child in children.items())
+
+    def _accessors(self):
+        """返回按下标取单词、排名、距离范围内孩子（不指定范围则为全部）以及孩子最大距离的函数"""
+        if self._arrays is None:
+            children = self.children
+
+            def edges(i, low=None, high=None):
+                c = children[i]
+                if low is None:
+                    return list(c.values())
+                return [c[d] for d in range(low, high + 1) if d in c]
+
+            def max_edge(i):
+                c = children[i]
+                return max(c) if c else None
+
+            return self.words.__getitem__, self.ranks.__getitem__, edges, max_edge
+
+        arrays = self._arrays
+        word_offsets, blob = arrays['word_offsets'], arrays['blob']
+        ranks, child_ptr = arrays['ranks'], arrays['child_ptr']
+        edge_dist, edge_child = arrays['edge_dist'], arrays['edge_child']
+
+        def word_of(i):
+            return bytes(blob[word_offsets[i]:word_offsets[i + 1]]).decode('utf8')
+
+        def rank_of(i):
+            return int(ranks[i])
+
+        def edges(i, low=None, high=None):
+            start, end = child_ptr[i], child_ptr[i + 1]
+            if start == end:
+                return []
+            if low is None:
+                return edge_child[start:end].tolist()
+            dists = edge_dist[start:end]
+            left = start + np.searchsorted(dists, low, 'left')
+            right = start + np.searchsorted(dists, high, 'right')
+            return edge_child[left:right].tolist()
+
+        def max_edge(i):
+            end = child_ptr[i + 1]
+            return int(edge_dist[end - 1]) if end > child_ptr[i] else None
+
+        return word_of, rank_of, edges, max_edge
 
     def query(self, word, top_n: int = 5, tol: int = 1):
         """查询在容忍度范围内匹配的单词
@@ -99,49 +371,112 @@ class BKTree(object):
         :param tol: 容忍的最小距离
         :return: 匹配的单词列表
         """
-        if self.root is None:
+        if self._size() == 0:
             raise RuntimeError("Please load or build dictionary first.")
 
+        case_fun = case_func_of(word)
+        word = word.lower()
+        word_of, rank_of, edges, max_edge = self._accessors()
         candidates = []
-
-        def dfs(tree):
-            p_word, rank, children = tree
-            dist = self.dist_fn(word, p_word)
+        # 用栈代替递归，避免树太深时栈溢出
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            p_word = word_of(i)
+            # 距离超过孩子最大距离加容忍度时，该结点及其子树都不可能匹配
+            max_d = max_edge(i)
+            bound = tol if max_d is None else max_d + tol
+            if self._bounded:
+                dist = self.dist_fn(word, p_word, max_dist=bound)
+            else:
+                dist = self.dist_fn(word, p_word)
+            if dist > bound:
+                continue
             if dist <= tol:
-                candidates.append((dist, rank, p_word))
+                rank = rank_of(i)
+                if rank != self.REMOVED:
+                    candidates.append((dist, rank, p_word))
+            stack.extend(edges(i, dist - tol, dist + tol))
 
-            for i in range(dist - tol, dist + tol + 1):
-                d = str(i)
-                if d in children:
-                    dfs(children[d])
-
-        case_fun = case_func_of(word)
-        word = word.lower()
-        dfs(self.root)
-        return [case_fun(word) for _, _, word in heapq.nsmallest(top_n, candidates)]
+        return [case_fun(w) for _, _, w in heapq.nsmallest(top_n, candidates)]
 
     def depth(self):
         """返回树的深度"""
-        if self.root is None:
+        if self._size() == 0:
             return 0
+        _, _, edges, _ = self._accessors()
+        max_depth = 0
+        stack = [(0, 0)]
+        while stack:
+            i, h = stack.pop()
+            max_depth = max(max_depth, h)
+            stack.extend((child, h + 1) for child in edges(i))
+        return max_depth
 
-        def dfs(tree, h):
-            _, _, children = tree
-            if len(children):
-                return max(dfs(child, h + 1) for child in children.values())
-            return h
+    def count(self):
+        """返回树中（未删除的）单词数量"""
+        if self._arrays is not None:
+            return int(np.count_nonzero(self._arrays['ranks'] != self.REMOVED))
+        return sum(rank != self.REMOVED for rank in self.ranks)
 
-        return dfs(self.root, 0)
 
-    def count(self):
-        """返回树的结点数量"""
-        if self.root is None:
-            return 0
+def _qgrams(s: str, q: int) -> Counter:
+    return Counter(s[i:i + q] for i in range(len(s) - q + 1))
+
+
+def _build_qgram_index(strings: List[str], q: int):
+    """建立(q-gram, 长度)到(下标, 出现次数)的倒排索引，以及长度到下标的索引"""
+    index = defaultdict(list)
+    by_length = defaultdict(list)
+    for j, s in enumerate(strings):
+        by_length[len(s)].append(j)
+        for gram, count in _qgrams(s, q).items():
+            index[(gram, len(s))].append((j, count))
+    return dict(index), dict(by_length)
+
+
+def _join_rows(rows: List[Tuple[int, str]], strings: List[str], index: dict,
+               by_length: dict, k: int, q: int) -> List[Tuple[int, int, int]]:
+    results = []
+    for i, a in rows:
+        la = len(a)
+        lengths = range(max(0, la - k), la + k + 1)
+        # 公共q-gram个数（多重集合的交）
+        shared = defaultdict(int)
+        for gram, count in _qgrams(a, q).items():
+            for lb in lengths:
+                for j, c in index.get((gram, lb), ()):
+                    shared[j] += min(count, c)
+        # 一次编辑最多破坏q个q-gram，距离不超过k的字符串对至少有这么多个公共q-gram
+        candidates = {j for j, c in shared.items()
+                      if c >= max(la, len(strings[j])) - q + 1 - k * q}
+        # 太短的字符串无法用q-gram过滤，只按长度过滤
+        for lb in lengths:
+            if max(la, lb) - q + 1 - k * q <= 0:
+                candidates.update(by_length.get(lb, ()))
+        for j in sorted(candidates):
+            dist = bounded_edit_dist(a, strings[j], k)
+            if dist <= k:
+                results.append((i, j, dist))
+    return results
+
+
+def fuzzy_join(list_a: Iterable[str], list_b: List[str], k: int,
+               q: int = 2, workers: int = None,
+               chunk_size: int = 1000) -> Iterator[Tuple[int, int, int]]:
+    """找出两个字符串集合中所有编辑距离不超过k的字符串对
 
-        def dfs(tree, cnt):
-            _, _, children = tree
-            if len(children):
-                return len(children) + sum(dfs(child, cnt) for child in children.values())
-            return cnt
+    先用list_b的q-gram倒排索引按长度和公共q-gram个数过滤，再用有上界的编辑距离验证
 
-        return dfs(self.root, 0)
+    :param list_a: 字符串集合，可以是迭代器
+    :param list_b: 建立索引的字符串列表
+    :param k: 最大编辑距离
+    :param q: q-gram的长度
+    :param workers: 进程数，默认在当前进程中计算
+    :param chunk_size: 每个任务处理list_a中的字符串个数
+    :return: 按list_a的顺序逐个产生(list_a下标, list_b下标, 距离)
+    """
+    list_b = list(list_b)
+    args = (list_b,) + _build_qgram_index(list_b, q) + (k, q)
+    for rows in ordered_map(_join_rows, chunked(enumerate(list_a), chunk_size), args, workers):
+        yield from rows
@@ -2,46 +2,226 @@
 # @Author  : uhauha2929
 # @Email   : ck143302@gmail.com
 import math
-from typing import Union, List
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Union, List, Callable, Tuple
 
+import numpy as np
+from scipy.sparse import csr_matrix
 
-def min_edit_dist(word1: str, word2: str) -> int:
-    """返回最小编辑距离Levenshtein"""
+from .._parallel import chunked, ordered_map
+
+
+def min_edit_dist(word1: str, word2: str, max_dist: int = None) -> int:
+    """返回最小编辑距离Levenshtein
+
+    Myers/Hyyrö位并行算法，用Python整数的每一位表示DP表格一列中相邻两格的差值，
+    每处理一个字符只需常数次位运算，时间复杂度O(⌈m/w⌉·n)
+    :param max_dist: 距离上界，一旦确定距离超过上界就提前返回max_dist + 1
+    """
+    # 较短的字符串作为模式串，位向量更短
+    if len(word1) > len(word2):
+        word1, word2 = word2, word1
     m = len(word1)
     n = len(word2)
-    if m * n == 0:
-        return m + n
-    # 优化为一维数组（在行上进行滚动），初始化表格第一行
-    dp = [i for i in range(n + 1)]
+    if max_dist is not None and n - m > max_dist:
+        return max_dist + 1
+    if m == 0:
+        return n
+    # 每个字符在模式串中出现位置的位掩码
+    peq = {}
+    for i, c in enumerate(word1):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv = mask, 0  # 垂直方向+1和-1的位向量
+    score = m  # 表格最后一行当前列的值
+    for j, c in enumerate(word2):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)  # 水平方向+1
+        mh = pv & xh  # 水平方向-1
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        # 第一行的值逐列加一，所以移入的是+1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+        # 剩下的每一列最多让距离减一
+        if max_dist is not None and score - (n - j - 1) > max_dist:
+            return max_dist + 1
+    return score
+
+
+def _banded_edit_dist(s1: str, s2: str, k: Union[int, float],
+                      ins_cost: Union[int, float] = 1,
+                      del_cost: Union[int, float] = 1,
+                      sub_cost: Union[int, float] = 1,
+                      trans_cost: Union[int, float] = None) -> Union[int, float]:
+    """Ukkonen对角带编辑距离，只计算|i - j| <= w的格子，超过k返回k + 1
+
+    每行只保存带内的2w + 1个格子，第i行第j列保存在下标j - i + w处，
+    因此左上角、上方、左方分别在上一行的同一下标、上一行的下一个下标、本行的上一个下标
+    """
+    if min(ins_cost, del_cost, sub_cost) <= 0 or (trans_cost is not None and trans_cost <= 0):
+        raise ValueError('Edit costs must be positive.')
+    m, n = len(s1), len(s2)
+    over = k + 1
+    # 长度差至少需要这么多次插入或删除
+    if (n - m) * ins_cost > k or (m - n) * del_cost > k:
+        return over
+    w = int(k // min(ins_cost, del_cost))
+    size = 2 * w + 1
+    # 多出的一个格子始终为over，用于越过带的边界时取值
+    prev = [over] * (size + 1)
+    for j in range(min(n, w) + 1):
+        if j * ins_cost <= k:
+            prev[j + w] = j * ins_cost
+    prev2 = None
     for i in range(1, m + 1):
-        corner = dp[0]  # 表示上一行左边的值，对于新行，就是左上角的值
-        dp[0] = i  # dp[0]在表格第一列上遍历
-        for j in range(1, n + 1):
-            tmp = dp[j]
-            if word1[i - 1] == word2[j - 1]:
-                dp[j] = corner
+        cur = [over] * (size + 1)
+        row_min = over
+        c1 = s1[i - 1]
+        for j in range(max(0, i - w), min(n, i + w) + 1):
+            idx = j - i + w
+            if j == 0:
+                d = i * del_cost
             else:
-                # dp[j]表示上面的值，dp[j - 1]表示左边的值，corner表示左上角的值
-                # 取三者最小的作为新的dp[j]（下一次左边的值）
-                dp[j] = min(dp[j] + 1, dp[j - 1] + 1, corner + 1)
-            corner = tmp
-    return dp[n]
+                c2 = s2[j - 1]
+                d = prev[idx] if c1 == c2 else prev[idx] + sub_cost
+                v = prev[idx + 1] + del_cost
+                if v < d:
+                    d = v
+                v = cur[idx - 1] + ins_cost
+                if v < d:
+                    d = v
+                if (trans_cost is not None and i > 1 and j > 1 and
+                        c1 == s2[j - 2] and s1[i - 2] == c2):
+                    v = prev2[idx] + trans_cost
+                    if v < d:
+                        d = v
+            if d > k:
+                d = over
+            cur[idx] = d
+            if d < row_min:
+                row_min = d
+        # 带内的最小值已经超过k，之后的行只会更大
+        if row_min > k:
+            return over
+        prev2, prev = prev, cur
+    return prev[n - m + w]
+
+
+def bounded_edit_dist(s1: str, s2: str, k: int) -> int:
+    """有上界的Levenshtein距离，距离大于k时返回k + 1
+
+    时间复杂度O(k·min(m,n))
+    """
+    return _banded_edit_dist(s1, s2, k)
+
+
+def bounded_damerau_dist(s1: str, s2: str, k: int) -> int:
+    """有上界的Damerau距离（相邻字符交换算一次编辑，每个子串只编辑一次），
+    距离大于k时返回k + 1
+    """
+    return _banded_edit_dist(s1, s2, k, trans_cost=1)
+
+
+def bounded_weighted_edit_dist(s1: str, s2: str, k: Union[int, float],
+                               ins_cost: Union[int, float] = 1,
+                               del_cost: Union[int, float] = 1,
+                               sub_cost: Union[int, float] = 1) -> Union[int, float]:
+    """有上界的加权编辑距离，距离大于k时返回k + 1
 
+    :param s1: 源字符串
+    :param s2: 目标字符串
+    :param k: 距离上界
+    :param ins_cost: 插入一个字符的代价
+    :param del_cost: 删除一个字符的代价
+    :param sub_cost: 替换一个字符的代价
+    :return: 从s1编辑到s2的最小代价
+    """
+    return _banded_edit_dist(s1, s2, k, ins_cost, del_cost, sub_cost)
+
+
+def _lcs_vector(pattern: Union[str, list], text: Union[str, list]) -> int:
+    """Allison–Dix/Hyyrö位并行LCS，返回处理完text后的位向量
+
+    第i位为0表示LCS(pattern[:i + 1], text) - LCS(pattern[:i], text) = 1
+    """
+    peq = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    mask = (1 << len(pattern)) - 1
+    v = mask
+    for c in text:
+        u = v & peq.get(c, 0)
+        v = ((v + u) | (v - u)) & mask
+    return v
 
-def longest_common_subsequence_length(s1: str, s2: str) -> int:
-    """返回最长公共子序列的长度"""
-    m = len(s1)
+
+def _lcs_row(s1: Union[str, list], s2: Union[str, list]) -> List[int]:
+    """返回LCS(s1, s2[:j])，j = 0..len(s2)"""
     n = len(s2)
-    c = [[0 for _ in range(n + 1)] for _ in range(m + 1)]
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if s1[i - 1] == s2[j - 1]:
-                c[i][j] = c[i - 1][j - 1] + 1
-            elif c[i - 1][j] >= c[i][j - 1]:
-                c[i][j] = c[i - 1][j]
-            else:
-                c[i][j] = c[i][j - 1]
-    return c[m][n]
+    if n == 0:
+        return [0]
+    bits = format(_lcs_vector(s2, s1), f'0{n}b')[::-1]
+    return [0] + list(accumulate(bit == '0' for bit in bits))
+
+
+def longest_common_subsequence_length(s1: Union[str, list], s2: Union[str, list]) -> int:
+    """返回最长公共子序列的长度
+
+    位并行算法，空间复杂度O(min(m,n)/w)
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    if len(s2) == 0:
+        return 0
+    v = _lcs_vector(s2, s1)
+    return len(s2) - bin(v).count('1')
+
+
+def longest_common_subsequence(s1: Union[str, list],
+                               s2: Union[str, list]) -> Tuple[Union[str, list], List[Tuple[int, int]]]:
+    """Hirschberg线性空间算法，返回最长公共子序列及其对齐位置
+
+    每次将s1对半分，分别正向和反向计算两半与s2的LCS行，找到最佳的切分点后分治，
+    LCS行用位并行算法计算，空间复杂度O(m + n)
+
+    :param s1: 字符串或者单词列表
+    :param s2: 字符串或者单词列表
+    :return: 最长公共子序列，以及对齐的下标对(i, j)列表，满足s1[i] == s2[j]
+    """
+    alignment = []
+    # 用栈代替递归，每一项为待对齐的区间s1[i0:i1]和s2[j0:j1]
+    stack = [(0, len(s1), 0, len(s2))]
+    while stack:
+        i0, i1, j0, j1 = stack.pop()
+        if i0 == i1 or j0 == j1:
+            continue
+        if i1 - i0 == 1:
+            for j in range(j0, j1):
+                if s2[j] == s1[i0]:
+                    alignment.append((i0, j))
+                    break
+            continue
+        mid = (i0 + i1) // 2
+        forward = _lcs_row(s1[i0:mid], s2[j0:j1])
+        backward = _lcs_row(s1[mid:i1][::-1], s2[j0:j1][::-1])
+        n = j1 - j0
+        k = max(range(n + 1), key=lambda j: forward[j] + backward[n - j])
+        stack.append((i0, mid, j0, j0 + k))
+        stack.append((mid, i1, j0 + k, j1))
+    alignment.sort()
+    subsequence = [s1[i] for i, _ in alignment]
+    if isinstance(s1, str):
+        subsequence = ''.join(subsequence)
+    return subsequence, alignment
 
 
 def longest_common_substring_length(s1: str, s2: str) -> int:
@@ -78,8 +258,10 @@ def sorensen_dice_coef(s1: Union[str, list], s2: Union[str, list]) -> float:
     return 2 * len(s1 & s2) / (len(s1) + len(s2))
 
 
-def hamming_dist(s1: Union[str, list], s2: Union[str, list]) -> int:
-    """汉明距离"""
+def hamming_dist(s1: Union[str, list, int], s2: Union[str, list, int]) -> int:
+    """汉明距离，两个非负整数则比较二进制位"""
+    if isinstance(s1, int) and isinstance(s2, int):
+        return bin(s1 ^ s2).count('1')
     if len(s1) != len(s2):
         raise ValueError('The sequence must be of the same length.')
     return sum(i != j for i, j in zip(s1, s2))
@@ -164,3 +346,207 @@ def jaro_winkler_similarity(s1: str, s2: str) -> float:
         prefix_len += 1
 
     return jaro + 0.1 * prefix_len * (1 - jaro)
+
+
+def _positions_of(s: str) -> dict:
+    """返回每个字符在字符串中出现的位置列表"""
+    positions = {}
+    for i, c in enumerate(s):
+        positions.setdefault(c, []).append(i)
+    return positions
+
+
+def _matched_characters(s: str, positions: dict, n: int, limit: int) -> List[str]:
+    """与jaro_winkler_similarity中的匹配过程相同，直接在另一个字符串的位置列表中查找窗口"""
+    matched = []
+    match_flags = bytearray(n)
+    for i, c in enumerate(s):
+        pos = positions.get(c)
+        if pos is None:
+            continue
+        k = bisect_left(pos, i - limit)
+        while k < len(pos) and pos[k] <= i + limit:
+            j = pos[k]
+            if not match_flags[j]:
+                matched.append(c)
+                match_flags[j] = 1
+                break
+            k += 1
+    return matched
+
+
+def jaro_winkler_many(query: str, candidates: List[str],
+                      threshold: float = 0.0) -> List[Tuple[int, float]]:
+    """计算一个字符串和多个候选字符串的Jaro–Winkler相似度，只返回不小于阈值的结果
+
+    查询串的字符位置只计算一次；根据长度和公共前缀得到相似度上界，不可能达到阈值的候选直接跳过
+
+    :param query: 查询字符串
+    :param candidates: 候选字符串列表
+    :param threshold: 相似度阈值
+    :return: (候选下标, 相似度)列表
+    """
+    m = len(query)
+    query_positions = _positions_of(query)
+    query_prefix = query[:4]
+    results = []
+    for index, candidate in enumerate(candidates):
+        n = len(candidate)
+        prefix_len = 0
+        for c1, c2 in zip(query_prefix, candidate[:4]):
+            if c1 != c2:
+                break
+            prefix_len += 1
+        # 匹配字符数最多为较短字符串的长度，且没有调换时相似度最大
+        common = min(m, n)
+        upper = (common / m + common / n + 1) / 3 if common else 0.0
+        if upper + 0.1 * prefix_len * (1 - upper) < threshold:
+            continue
+
+        limit = common // 2
+        matched1 = _matched_characters(query, _positions_of(candidate), n, limit)
+        matched2 = _matched_characters(candidate, query_positions, m, limit)
+        match_count = len(matched1)
+        tran_count = 0
+        for c1, c2 in zip(matched1, matched2):
+            if c1 != c2:
+                tran_count += 1
+        half_tran = tran_count // 2
+
+        if not match_count:
+            jaro = 0.0
+        else:
+            jaro = 1 / 3 * ((match_count / m +
+                             match_count / n +
+                             (match_count - half_tran) / match_count))
+        score = jaro + 0.1 * prefix_len * (1 - jaro)
+        if score >= threshold:
+            results.append((index, score))
+    return results
+
+
+def _encode_strings(strings: List[str]):
+    """将字符串编码成用-1填充的码点矩阵和长度数组"""
+    lengths = np.array([len(s) for s in strings], np.int64)
+    codes = np.full((len(strings), int(lengths.max(initial=0))), -1, np.int32)
+    for i, s in enumerate(strings):
+        if s:
+            codes[i, :len(s)] = np.frombuffer(s.encode('utf-32-le'), '<u4')
+    return codes, lengths
+
+
+def _levenshtein_block(a_codes: np.ndarray, a_lens: np.ndarray,
+                       b_codes: np.ndarray, b_lens: np.ndarray) -> np.ndarray:
+    """同时对所有字符串对按行推进DP，返回距离矩阵
+
+    新一行先由上方和左上角得到t[j]，再考虑左方：cur[j] = min(t[l] + j - l)，l <= j，
+    即t[j] - j的前缀最小值加上j，可以用np.minimum.accumulate一次完成
+    """
+    ra, rb = len(a_lens), len(b_lens)
+    steps = np.arange(b_codes.shape[1] + 1, dtype=np.int32)
+    prev = np.broadcast_to(steps, (ra, rb, len(steps))).copy()
+    # 第0行即空串到各字符串的距离
+    result = np.broadcast_to(b_lens.astype(np.int32), (ra, rb)).copy()
+    columns = np.arange(rb)
+    for i in range(1, a_codes.shape[1] + 1):
+        cost = a_codes[:, None, None, i - 1] != b_codes[None, :, :]
+        cur = np.empty_like(prev)
+        cur[..., 0] = i
+        np.minimum(prev[..., 1:] + 1, prev[..., :-1] + cost, out=cur[..., 1:])
+        cur -= steps
+        np.minimum.accumulate(cur, axis=2, out=cur)
+        cur += steps
+        done = a_lens == i
+        if done.any():
+            result[done] = cur[done][:, columns, b_lens]
+        prev = cur
+    return result
+
+
+def _hamming_block(a_codes: np.ndarray, a_lens: np.ndarray,
+                   b_codes: np.ndarray, b_lens: np.ndarray) -> np.ndarray:
+    if (a_lens[:, None] != b_lens[None, :]).any():
+        raise ValueError('The sequence must be of the same length.')
+    width = min(a_codes.shape[1], b_codes.shape[1])
+    return (a_codes[:, None, :width] != b_codes[None, :, :width]).sum(axis=2, dtype=np.int32)
+
+
+def _jaro_winkler_block(a_strings: List[str], b_strings: List[str]) -> np.ndarray:
+    return np.array([[jaro_winkler_similarity(a, b) for b in b_strings]
+                     for a in a_strings], np.float64).reshape(len(a_strings), len(b_strings))
+
+
+# 名称: (按块计算的函数, 是否为相似度, 是否需要编码)
+_CDIST_METRICS = {
+    'levenshtein': (_levenshtein_block, False, True),
+    'hamming': (_hamming_block, False, True),
+    'jaro_winkler': (_jaro_winkler_block, True, False),
+}
+
+
+def _cdist_rows(a_strings: List[str], b_strings: List[str], b_encoded, metric: str,
+                threshold: Union[int, float, None], max_cells: int):
+    block_fn, is_similarity, encode = _CDIST_METRICS[metric]
+    if encode:
+        a_codes, a_lens = _encode_strings(a_strings)
+        b_codes, b_lens = b_encoded
+        # 按列分块，控制三维DP数组的大小
+        cols = max(1, max_cells // max(1, len(a_strings) * (b_codes.shape[1] + 1)))
+        parts = []
+        for start in range(0, len(b_strings), cols):
+            lens = b_lens[start:start + cols]
+            codes = b_codes[start:start + cols, :int(lens.max(initial=0))]
+            parts.append(block_fn(a_codes, a_lens, codes, lens))
+        block = np.hstack(parts) if parts else np.zeros((len(a_strings), 0), np.int32)
+    else:
+        block = block_fn(a_strings, b_strings)
+    if threshold is None:
+        return block
+    rows, cols = np.nonzero(block >= threshold if is_similarity else block <= threshold)
+    return rows, cols, block[rows, cols]
+
+
+def cdist(list_a: List[str], list_b: List[str],
+          metric: Union[str, Callable] = 'levenshtein',
+          workers: int = None,
+          threshold: Union[int, float] = None,
+          block_size: int = 256,
+          max_cells: int = 1 << 22) -> Union[np.ndarray, csr_matrix]:
+    """计算两个字符串集合两两之间的距离（相似度）矩阵
+
+    字符串编码成填充后的整数矩阵，一次对一块字符串对向量化地计算，
+    行块可以分配到多个进程中计算。jaro_winkler暂无向量化实现，在各进程中逐对计算
+
+    :param list_a: 字符串列表，对应矩阵的行
+    :param list_b: 字符串列表，对应矩阵的列
+    :param metric: 'levenshtein'、'hamming'、'jaro_winkler'或对应的函数
+    :param workers: 进程数，默认在当前进程中计算
+    :param threshold: 阈值，指定后返回稀疏矩阵，只保留距离不大于（相似度不小于）阈值的对，
+                      距离为0的对以显式零存储
+    :param block_size: 每个任务计算的行数
+    :param max_cells: 向量化DP时单个三维数组的最大元素个数
+    :return: 形状为(len(list_a), len(list_b))的矩阵
+    """
+    if callable(metric):
+        metric = {min_edit_dist: 'levenshtein',
+                  hamming_dist: 'hamming',
+                  jaro_winkler_similarity: 'jaro_winkler'}.get(metric, metric)
+    if metric not in _CDIST_METRICS:
+        raise ValueError(f'Unsupported metric: {metric}')
+    _, is_similarity, encode = _CDIST_METRICS[metric]
+    dtype = np.float64 if is_similarity else np.int32
+    list_a, list_b = list(list_a), list(list_b)
+    b_encoded = _encode_strings(list_b) if encode else None
+    args = (list_b, b_encoded, metric, threshold, max_cells)
+    results = list(ordered_map(_cdist_rows, chunked(list_a, block_size), args, workers))
+
+    shape = (len(list_a), len(list_b))
+    if threshold is None:
+        if not results:
+            return np.zeros(shape, dtype)
+        return np.vstack(results).astype(dtype, copy=False)
+    offsets = range(0, len(list_a), block_size)
+    rows = np.concatenate([r + offset for (r, _, _), offset in zip(results, offsets)] or [[]])
+    cols = np.concatenate([c for _, c, _ in results] or [[]])
+    vals = np.concatenate([v for _, _, v in results] or [[]]).astype(dtype, copy=False)
+    return csr_matrix((vals, (rows.astype(np.int64), cols.astype(np.int64))), shape=shape)
@@ -14,7 +14,7 @@ all_letters = whitespace + letters + digits + punctuation + brackets
 class Splitter(object):
 
     def __init__(self, word_freq_file: str = None):
-        self.words = load_words_by_freq(word_freq_file)
+        self.words = list(load_words_by_freq(word_freq_file))
         self.max_word_len = max(map(len, self.words))
         self.loss_dict = self.get_losses(self.words)
 
@@ -1,4 +1,16 @@
+import importlib
+
 from .common import *
-from . import rank
-from . import tfidf
-from . import metric
\ No newline at end of file
+
+# 子模块在第一次访问时才导入（PEP 562）
+_submodules = ('rank', 'tfidf', 'metric', 'vectorize', 'corpus', 'search', 'ngram')
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
@@ -3,18 +3,19 @@
 # @Email   : ck143302@gmail.com
 import warnings
 import re
-from typing import Union, List, Tuple, Callable
+from collections import deque
+from typing import Union, List, Tuple, Callable, Iterable, Iterator, FrozenSet, TextIO
 import string
+import unicodedata
 
+from .._parallel import chunked, ordered_map
 from ..static import load_stopwords
 
 
-def get_tokenized_words(docs: List[str],
-                        tokenizer: Callable[[str], List[str]] = lambda s: s.split(),
-                        word_min_len: int = 2,
-                        stopwords: str = None):
-    """文档分词并去除停用词"""
-    stopwords = load_stopwords(stopwords)
+def _tokenize_docs(docs: List[str],
+                   tokenizer: Callable[[str], List[str]],
+                   word_min_len: int,
+                   stopwords: FrozenSet[str]) -> List[List[str]]:
     texts = []
     for doc in docs:
         words = []
@@ -26,6 +27,42 @@ def get_tokenized_words(docs: List[str],
     return texts
 
 
+def iter_tokenized_words(docs: Iterable[str],
+                         tokenizer: Callable[[str], List[str]] = str.split,
+                         word_min_len: int = 2,
+                         stopwords: str = None,
+                         chunk_size: int = 1000,
+                         workers: int = None,
+                         batched: bool = False) -> Iterator[Union[List[str], List[List[str]]]]:
+    """惰性地对文档分词并去除停用词
+
+    文档按块读取和处理，内存只与块的大小有关，可以直接传入文件对象逐行处理
+
+    :param docs: 文档的可迭代对象
+    :param tokenizer: 分词器，多进程时必须可以被pickle（不能是lambda）
+    :param word_min_len: 单词的最小长度
+    :param stopwords: 停用词文件路径，默认使用内置停用词
+    :param chunk_size: 每块的文档数
+    :param workers: 进程数，默认在当前进程中处理，适用于耗CPU的分词器
+    :param batched: 是否按块产生结果
+    :return: 按输入顺序产生每篇文档（或每块文档）的单词列表
+    """
+    args = (tokenizer, word_min_len, load_stopwords(stopwords))
+    for texts in ordered_map(_tokenize_docs, chunked(docs, chunk_size), args, workers):
+        if batched:
+            yield texts
+        else:
+            yield from texts
+
+
+def get_tokenized_words(docs: List[str],
+                        tokenizer: Callable[[str], List[str]] = lambda s: s.split(),
+                        word_min_len: int = 2,
+                        stopwords: str = None):
+    """文档分词并去除停用词"""
+    return list(iter_tokenized_words(docs, tokenizer, word_min_len, stopwords))
+
+
 def ngrams(text: Union[str, List[str]], n: int = 2):
     """返回一个字符串所有的ngrams集合"""
     if n <= 0:
@@ -36,6 +73,17 @@ def ngrams(text: Union[str, List[str]], n: int = 2):
     return [tuple(text[i: i + n]) for i in range(len(text) - n + 1)]
 
 
+def iter_ngrams(text: Iterable, n: int = 2) -> Iterator[tuple]:
+    """惰性地产生ngram元组，text可以是任意可迭代对象，内存只与n有关"""
+    if n <= 0:
+        raise ValueError('Invalid length.')
+    window = deque(maxlen=n)
+    for item in text:
+        window.append(item)
+        if len(window) == n:
+            yield tuple(window)
+
+
 def bigrams(text: Union[str, List[str]]) -> List[Tuple[str, str]]:
     """返回一个字符串所有bigram集合
     :param text: 分词后的集合，否则以字符为单位
@@ -87,27 +135,163 @@ def split_into_sentences(text: str, lang='en') -> List[str]:
         raise ValueError('Unsupported language.')
 
 
+# 分句规则合并成一个正则表达式，一次扫描完成，开头的先行断言用于快速跳过不可能匹配的位置
+# 英文：mask为不作为句子结尾的点（数字中的点、常用缩写），end为句子的结尾。
+# 原规则先屏蔽缩写的点再找结尾，所以缩写词（如".A."）的点不能作为结尾，
+# 而常用缩写（如"Dr."）的点也不能作为缩写词的第二个点
+# 中文：end为句子的结尾，原规则会吃掉结尾后的一个字符，紧跟的点和省略号因此不能再次断句，
+# 被吃掉的字符属于下一句；换行符本身也是分隔符
+_EN_PREFIXES = ('Mr', 'St', 'Mrs', 'Ms', 'Dr', 'Prof', 'Capt', 'Cpt', 'Lt', 'Mt',
+                'Inc', 'Ltd', 'Jr', 'Sr', 'Co', 'etc')
+_EN_ACRONYM = r'\.[A-Za-z]+' + ''.join(rf'(?<!{p})' for p in _EN_PREFIXES) + r'\.'
+_SENTENCE_PATTERNS = {
+    'en': re.compile(r"(?=[\d.?!MSDPCLIJe])"
+                     r"(?:(?P<mask>\d\.\d"
+                     rf"|(?:{'|'.join(_EN_PREFIXES)})[.]"
+                     rf"|{_EN_ACRONYM})"
+                     rf"|(?P<end>(?:[?!]|\.(?!{_EN_ACRONYM[2:]}))+\s*[\'\"’”]?)"
+                     r"\s*(?=[\"\'“‘]?[A-Z][a-z]*))"),
+    'zh': re.compile(r'(?=[。！!？\\?；;.…\n])'
+                     r'(?:(?P<end>[。！!？\\?；;]+(?=[^”’。！!？\\?])'
+                     r'|\.{3,6}(?=[^”’])'
+                     r'|…{1,2}(?=[^”’])'
+                     r'|[。！!？\\?]+[”’](?=[^，。！!？\\?]))'
+                     r'(?:(?<=\.)\.|(?<=…)…)?'
+                     r'|\n)'),
+}
+
+
+def iter_sentences(source: Union[str, TextIO, Iterable[str]],
+                   lang: str = 'en',
+                   chunk_size: int = 1 << 16,
+                   margin: int = 256) -> Iterator[Tuple[str, int, int]]:
+    """流式分句，规则与split_into_sentences相同，但只扫描一遍文本
+
+    按块读取文本，缓冲区末尾margin个字符内的断句需要后面的内容才能确定，
+    留到读入下一块后再判断，未结束的句子跨块保留，margin需要大于最长的连续字母、标点或空白的长度。
+    英文的结果与split_into_sentences完全一致
+
+    :param source: 字符串、文件对象或者字符串块的可迭代对象
+    :param lang: 'en'或'zh'，中文会跳过空白的句子，但不去掉最后一句末尾的空白
+    :param chunk_size: 从文件对象每次读取的字符数
+    :param margin: 缓冲区末尾暂不断句的字符数
+    :return: 逐个产生(句子, 开始位置, 结束位置)，位置为在整个文本中的字符下标
+    """
+    lang = lang.lower()
+    if lang not in _SENTENCE_PATTERNS:
+        raise ValueError('Unsupported language.')
+    pattern = _SENTENCE_PATTERNS[lang]
+    if isinstance(source, str):
+        chunks = [source]
+    elif hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), '')
+    else:
+        chunks = source
+
+    buffer = ''
+    offset = 0  # 缓冲区开头在整个文本中的位置
+    pos = 0  # 下一次扫描的开始位置，即上一个匹配的结尾
+
+    def scan(limit: int):
+        nonlocal buffer, offset, pos
+        start = 0
+        for m in pattern.finditer(buffer, pos):
+            if m.end() > limit:
+                break
+            pos = m.end()
+            if m.lastgroup == 'mask':
+                continue
+            if m.lastgroup == 'end':
+                end = m.end('end')
+                # 英文丢掉句子之间的空白，中文保留被吃掉的字符
+                next_start = m.end() if lang == 'en' else end
+            else:
+                end, next_start = m.start(), m.end()
+            sentence = buffer[start:end]
+            if lang == 'en' or sentence.strip():
+                yield sentence, offset + start, offset + end
+            start = next_start
+        buffer = buffer[start:]
+        offset += start
+        pos -= start
+
+    for chunk in chunks:
+        buffer += chunk
+        yield from scan(len(buffer) - margin)
+    yield from scan(len(buffer))
+    # 与split_into_sentences一致，英文的最后一句即使为空也会产生
+    if lang == 'en' or buffer.strip():
+        yield buffer, offset, offset + len(buffer)
+
+
+# 删除标点前和文本末尾的空格，以及连续空格中第一个之后的空格
+_EXTRA_SPACES = re.compile(r' +(?=[,.?]|\Z)|(?<= ) +')
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+_PUNCTUATION_BYTES = string.punctuation.encode('ascii')
+_ASCII_LOWER_TABLE = bytes.maketrans(string.ascii_uppercase.encode('ascii'),
+                                     string.ascii_lowercase.encode('ascii'))
+
+
 def remove_extra_spaces(text: str):
     """去除英文句子中多余的空格"""
-    n = len(text)
-    chars = []
-    space_found = False
-    for i in range(n):
-        if text[i] != ' ':
-            if space_found:
-                if text[i] not in ',.?':
-                    chars.append(' ')
-                space_found = False
-            chars.append(text[i])
-        elif text[i - 1] != ' ':
-            space_found = True
-    return ''.join(chars)
+    # 文本以空格结尾时，开头的空格也全部去掉
+    if text.endswith(' '):
+        text = text.lstrip(' ')
+    return _EXTRA_SPACES.sub('', text)
 
 
 def remove_punctuation(text: str):
     """去除句子中的标点符号"""
-    translator = str.maketrans('', '', string.punctuation)
-    return text.translate(translator)
+    return text.translate(_PUNCTUATION_TABLE)
+
+
+class Normalizer:
+    """文本规范化，依次去除变音符号、转成小写、去除标点符号和去除多余的空格
+
+    结果与依次调用strip_accents、str.lower、remove_punctuation和remove_extra_spaces相同，
+    转换表和正则表达式只构建一次；去除变音符号后只剩ASCII字节，
+    转小写和去除标点在同一次bytes.translate中完成
+    """
+
+    def __init__(self,
+                 lowercase: bool = True,
+                 strip_accents: bool = False,
+                 remove_punctuation: bool = True,
+                 remove_extra_spaces: bool = True):
+        """
+        :param lowercase: 是否转成小写
+        :param strip_accents: 是否去除变音符号，同时会去掉所有非ASCII字符
+        :param remove_punctuation: 是否去除英文标点符号
+        :param remove_extra_spaces: 是否去除多余的空格
+        """
+        self.lowercase = lowercase
+        self.strip_accents = strip_accents
+        self.remove_punctuation = remove_punctuation
+        self.remove_extra_spaces = remove_extra_spaces
+        self._bytes_table = _ASCII_LOWER_TABLE if lowercase else None
+        self._bytes_delete = _PUNCTUATION_BYTES if remove_punctuation else b''
+
+    def normalize(self, text: str) -> str:
+        """规范化一段文本"""
+        if self.strip_accents:
+            data = unicodedata.normalize('NFD', text).encode('ascii', 'ignore')
+            text = data.translate(self._bytes_table, self._bytes_delete).decode('ascii')
+        else:
+            if self.lowercase:
+                text = text.lower()
+            if self.remove_punctuation:
+                text = text.translate(_PUNCTUATION_TABLE)
+        if self.remove_extra_spaces:
+            text = remove_extra_spaces(text)
+        return text
+
+    def normalize_many(self, texts: Iterable[str]) -> Iterator[str]:
+        """逐个规范化文本，惰性求值，可以直接传入打开的文件按行处理
+
+        :param texts: 字符串的可迭代对象或者文件对象
+        :return: 规范化后的字符串的迭代器
+        """
+        return map(self.normalize, texts)
 
 
 def full_justify(words: List[str], max_width: int) -> List[str]:
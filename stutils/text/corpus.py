@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# @Author  : uhauha2929
+# @Email   : ck143302@gmail.com
+import math
+from collections import Counter
+from typing import List, Iterable, Dict, Callable
+
+from .common import iter_tokenized_words
+from .._parallel import chunked, ordered_map
+
+
+class CorpusStats(object):
+
+    def __init__(self):
+        """语料统计量：文档频率、词频、文档数和文档总长度
+
+        各个分片的统计量可以相加合并，合并后用于计算tfidf或BM25的idf
+        """
+        self.df = Counter()
+        self.tf = Counter()
+        self.n_docs = 0
+        self.total_len = 0
+
+    def update(self, texts: Iterable[List[str]]) -> 'CorpusStats':
+        """统计分好词的文档"""
+        for words in texts:
+            self.tf.update(words)
+            self.df.update(set(words))
+            self.n_docs += 1
+            self.total_len += len(words)
+        return self
+
+    def merge(self, other: 'CorpusStats') -> 'CorpusStats':
+        """合并另一个分片的统计量"""
+        self.df.update(other.df)
+        self.tf.update(other.tf)
+        self.n_docs += other.n_docs
+        self.total_len += other.total_len
+        return self
+
+    @property
+    def avg_doc_len(self) -> float:
+        """平均文档长度"""
+        return self.total_len / self.n_docs if self.n_docs else 0.0
+
+    def idf(self) -> Dict[str, float]:
+        """与get_idf相同的idf值，可以作为get_tfidf的idf_dict"""
+        return {word: math.log(self.n_docs / (1 + df)) for word, df in self.df.items()}
+
+    def bm25_idf(self) -> Dict[str, float]:
+        """BM25的idf值：log((N - df + 0.5) / (df + 0.5) + 1)"""
+        return {word: math.log((self.n_docs - df + 0.5) / (df + 0.5) + 1)
+                for word, df in self.df.items()}
+
+
+def _shard_stats(docs: List[str],
+                 tokenizer: Callable[[str], List[str]],
+                 word_min_len: int,
+                 stopwords: str) -> CorpusStats:
+    return CorpusStats().update(iter_tokenized_words(docs, tokenizer, word_min_len, stopwords))
+
+
+def get_corpus_stats(docs: Iterable[str],
+                     tokenizer: Callable[[str], List[str]] = str.split,
+                     word_min_len: int = 2,
+                     stopwords: str = None,
+                     chunk_size: int = 10000,
+                     workers: int = None) -> CorpusStats:
+    """分片统计语料并合并结果
+
+    :param docs: 文档的可迭代对象，例如逐行读取的文件
+    :param tokenizer: 分词器，多进程时必须可以被pickle
+    :param word_min_len: 单词的最小长度
+    :param stopwords: 停用词文件路径，默认使用内置停用词
+    :param chunk_size: 每个分片的文档数
+    :param workers: 进程数，默认在当前进程中统计
+    :return: 合并后的语料统计量
+    """
+    stats = CorpusStats()
+    for shard in ordered_map(_shard_stats, chunked(docs, chunk_size),
+                             (tokenizer, word_min_len, stopwords), workers):
+        stats.merge(shard)
+    return stats
@@ -1,9 +1,10 @@
 
 from collections import Counter
 import math
-from typing import List
+from typing import List, Tuple
 
 from .common import ngrams
+from .._parallel import chunked, ordered_map
 
 
 def bleu(references: List[List[str]], candidate: List[str], n: int=4, weights: List[float]=None) -> float:
@@ -50,3 +51,74 @@ def bleu_n(references: List[List[str]], candidate: List[str], n: int=2) -> float
     numerator = sum(clipped_counts.values())
     denominator = max(1, sum(counts.values()))
     return numerator/denominator
+
+
+def _count_ngrams(words: List[str], n: int) -> Counter:
+    """一次遍历统计1到n阶的所有ngram"""
+    counts = Counter()
+    length = len(words)
+    for i in range(length):
+        for k in range(i + 1, min(i + n, length) + 1):
+            counts[tuple(words[i:k])] += 1
+    return counts
+
+
+def _bleu_stats(pairs: List[Tuple[List[List[str]], List[str]]],
+                n: int) -> Tuple[List[int], List[int], int, int]:
+    """累加一批句子各阶截断后的匹配数、候选ngram总数、候选长度和最短参考长度"""
+    numerators = [0] * n
+    denominators = [0] * n
+    candidate_len, reference_len = 0, 0
+    for references, candidate in pairs:
+        counts = _count_ngrams(candidate, n)
+        max_counts = {}
+        for reference in references:
+            for ngram, count in _count_ngrams(reference, n).items():
+                if ngram in counts and count > max_counts.get(ngram, 0):
+                    max_counts[ngram] = count
+        for ngram, count in counts.items():
+            numerators[len(ngram) - 1] += min(count, max_counts.get(ngram, 0))
+            denominators[len(ngram) - 1] += count
+        candidate_len += len(candidate)
+        reference_len += min(map(len, references))
+    return numerators, denominators, candidate_len, reference_len
+
+
+def corpus_bleu(list_of_references: List[List[List[str]]],
+                candidates: List[List[str]],
+                n: int = 4,
+                weights: List[float] = None,
+                workers: int = None,
+                chunk_size: int = 10000) -> float:
+    """计算整个测试集的bleu值
+
+    各阶ngram的截断匹配数和候选ngram数在所有句子上累加后再计算精确率，
+    简短惩罚使用候选总长度和最短参考句总长度
+
+    :param list_of_references: 每个候选句的参考句子（已分词）集合
+    :param candidates: 候选句子（已分词）列表
+    :param n: 连续单词个数(ngram)，默认为4
+    :param weights: ngram的权重，默认为均匀分布
+    :param workers: 进程数，默认在当前进程中计算
+    :param chunk_size: 每个任务处理的句子数
+    :return: bleu值
+    """
+    if weights is None:
+        weights = [1 / n] * n
+    if len(weights) != n:
+        raise ValueError("The number of weights must be the same as N.")
+    if len(list_of_references) != len(candidates):
+        raise ValueError("The number of references must be the same as candidates.")
+
+    pairs = list(zip(list_of_references, candidates))
+    results = list(ordered_map(_bleu_stats, chunked(pairs, chunk_size), (n,), workers))
+
+    numerators = [sum(r[0][i] for r in results) for i in range(n)]
+    denominators = [sum(r[1][i] for r in results) for i in range(n)]
+    lc = sum(r[2] for r in results)
+    lr = sum(r[3] for r in results)
+    if lc == 0 or min(numerators) == 0:
+        return 0.0
+    bp = math.exp(1 - lr / lc) if lc <= lr else 1
+    log_precisions = [math.log(i / j) for i, j in zip(numerators, denominators)]
+    return bp * math.exp(sum(i * j for i, j in zip(log_precisions, weights)))
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# @Author  : uhauha2929
+# @Email   : ck143302@gmail.com
+from typing import List, Dict, Iterable, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 无法精确打包时使用的多项式哈希乘数（奇数，按2^64取模）
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def encode_tokens(texts: Iterable[List[str]],
+                  vocabulary: Dict[str, int] = None) -> Tuple[List[np.ndarray], Dict[str, int]]:
+    """将分好词的文本编码为整数数组
+
+    :param texts: 分好词的文本集合
+    :param vocabulary: 已有的词表，新词会追加到其中
+    :return: 每个文本的int64数组，以及词表；len(词表)即ngram_ids的base，
+             所有要互相比较的文本必须用同一个词表编码并传入同一个base
+    """
+    vocabulary = {} if vocabulary is None else vocabulary
+    arrays = [np.fromiter((vocabulary.setdefault(w, len(vocabulary)) for w in words),
+                          np.int64, len(words))
+              for words in texts]
+    return arrays, vocabulary
+
+
+def ngram_ids(ids: np.ndarray, n: int, base: int) -> np.ndarray:
+    """将整数编码的文本转换为打包成int64的ngram编号
+
+    用滑动窗口视图取出所有窗口，按base进制打包：id = w0 * base^(n-1) + ... + w(n-1)；
+    base^n超过int64范围时改用按2^64取模的多项式哈希，此时可能出现冲突
+
+    :param ids: 单词编号数组
+    :param n: ngram的长度
+    :param base: 进制，即词表大小，不同文本之间比较时必须一致
+    :return: 长度为len(ids) - n + 1的int64数组
+    """
+    if n <= 0:
+        raise ValueError('Invalid length.')
+    ids = np.asarray(ids, np.int64)
+    if len(ids) and (ids.min() < 0 or ids.max() >= base):
+        raise ValueError(f'Word ids must be in range of [0, {base}).')
+    if len(ids) < n:
+        return np.zeros(0, np.int64)
+    windows = sliding_window_view(ids, n)
+    if base ** n <= np.iinfo(np.int64).max:
+        packed = windows[:, 0].copy()
+        for k in range(1, n):
+            packed *= base
+            packed += windows[:, k]
+        return packed
+    windows = windows.astype(np.uint64)
+    hashed = windows[:, 0].copy()
+    for k in range(1, n):
+        hashed *= _HASH_MULTIPLIER
+        hashed += windows[:, k]
+    return hashed.view(np.int64)
+
+
+def unpack_ngram_ids(packed: np.ndarray, n: int, base: int) -> np.ndarray:
+    """将精确打包的ngram编号还原为形状为(len(packed), n)的单词编号"""
+    packed = np.asarray(packed, np.int64)
+    if base ** n > np.iinfo(np.int64).max:
+        raise ValueError('Hashed ngram ids cannot be unpacked.')
+    result = np.empty((len(packed), n), np.int64)
+    rest = packed.copy()
+    for k in range(n - 1, -1, -1):
+        rest, result[:, k] = np.divmod(rest, base)
+    return result
@@ -4,56 +4,90 @@
 import heapq
 from math import log
 from typing import List, Union, Callable, Tuple
-from .common import ngrams, get_tokenized_words
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .common import get_tokenized_words
+
+
+def _power_iteration(matrix: csr_matrix, alpha: float, n_iter: int, tol: float) -> np.ndarray:
+    """TextRank迭代：v = (1 - alpha) + alpha * W @ (v / degree)，直到变化量小于tol
+
+    degree为每个结点的权重之和（加权PageRank），每轮传出的总分数不变，任意正权重都会收敛；
+    0/1矩阵时就是邻居个数
+
+    :param matrix: 对称的权重矩阵
+    :param n_iter: 最大迭代次数
+    """
+    n = matrix.shape[0]
+    degree = np.asarray(matrix.sum(axis=1), np.float64).ravel()
+    values = np.full(n, 1 / n)
+    # 没有邻居的结点不向外传递分数，分数为1 - alpha
+    connected = degree > 0
+    for _ in range(n_iter):
+        spread = np.divide(values, degree, out=np.zeros(n), where=connected)
+        new_values = (1 - alpha) + alpha * (matrix @ spread)
+        converged = np.abs(new_values - values).max() < tol
+        values = new_values
+        if converged:
+            break
+    return values
 
 
 def word_rank(doc: Union[List[str], str],
               top_n: int = 10,
-              n_iter: int = 10,
+              n_iter: int = 100,
               window_size: int = 3,
               alpha: float = 0.85,
               word_min_len: int = 2,
               weight: bool = False,
               tokenizer: Callable[[str], List[str]] = lambda s: s.split(),
-              stopwords: str = None) -> List[Union[str, Tuple[str, float]]]:
+              stopwords: str = None,
+              tol: float = 1e-6) -> List[Union[str, Tuple[str, float]]]:
     """TextRank提取关键词的简单实现
 
     :param doc: 可以是句子集合或整篇文档
     :param top_n: 选取分数最高的前N个
-    :param n_iter: 迭代次数
+    :param n_iter: 最大迭代次数
     :param window_size: 滑动窗口的长度，用于找出共现的词建立边
     :param alpha: 平滑系数
     :param word_min_len: 关键词的最小长度
     :param weight: 是否返回权重
     :param tokenizer: 句子分词器，默认以空格分
     :param stopwords: 自定义停用词文件路径，否则用内置停用词
+    :param tol: 两次迭代分数的最大变化量小于该值时停止
     :return: 关键词及其分数组成的元组集合
     """
     if isinstance(doc, str):
         doc = [doc]
     texts = get_tokenized_words(doc, tokenizer, word_min_len, stopwords)
-    nodes = {}
+    # 单词编码为整数，只有长度不小于窗口的句子才会产生共现边
+    vocabulary = {}
+    rows, cols = [], []
     for words in texts:
-        for ngram in ngrams(words, n=window_size):
-            for i in range(len(ngram)):
-                links = set()
-                for j in range(len(ngram)):
-                    if i != j:
-                        links.add(ngram[j])
-                if ngram[i] not in nodes:
-                    nodes[ngram[i]] = set()
-                nodes[ngram[i]] |= links
-    values = {}
-    for _ in range(n_iter):
-        for word, links in nodes.items():
-            val = 1 - alpha
-            for link in links:
-                val += alpha * (1 / len(nodes[link])) * values.get(link, 1 / len(nodes))
-            values[word] = val
+        if len(words) < window_size:
+            continue
+        ids = np.fromiter((vocabulary.setdefault(w, len(vocabulary)) for w in words),
+                          np.int64, len(words))
+        # 窗口内任意两个位置的词都相连
+        for d in range(1, window_size):
+            rows.extend((ids[:-d], ids[d:]))
+            cols.extend((ids[d:], ids[:-d]))
+    if not vocabulary:
+        return []
+    n = len(vocabulary)
+    # window_size为1时没有边
+    rows = np.concatenate(rows) if rows else np.zeros(0, np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, np.int64)
+    matrix = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+    # 只考虑是否存在边
+    matrix.data[:] = 1
+    values = _power_iteration(matrix, alpha, n_iter, tol)
 
-    keywords = [item if weight else item[0] for item in
-                heapq.nlargest(top_n, values.items(), key=lambda x: x[1])]
-    return keywords
+    words = sorted(vocabulary, key=vocabulary.get)
+    top = heapq.nlargest(top_n, range(n), key=values.__getitem__)
+    return [(words[i], float(values[i])) if weight else words[i] for i in top]
 
 
 def _similarity_func(s1: Union[str, List[str]],
@@ -64,55 +98,72 @@ def _similarity_func(s1: Union[str, List[str]],
     return len(set(s1) & set(s2)) / (log(m) + log(n))
 
 
+def _shared_word_pairs(tokenized_texts: List[List[str]]):
+    """返回至少有一个公共词的句子对(i < j)及其公共词（去重后）的个数
+
+    句子-词的0/1矩阵与自身转置相乘，只有共享单词的句子对才会出现在结果中
+    """
+    vocabulary = {}
+    rows, cols = [], []
+    for i, words in enumerate(tokenized_texts):
+        for word in set(words):
+            rows.append(i)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+    incidence = csr_matrix((np.ones(len(rows)), (rows, cols)),
+                           shape=(len(tokenized_texts), len(vocabulary)))
+    shared = (incidence @ incidence.T).tocoo()
+    upper = shared.row < shared.col
+    return shared.row[upper], shared.col[upper], shared.data[upper]
+
+
 def text_rank(texts: List[str],
               top_n: int = 5,
-              n_iter: int = 10,
+              n_iter: int = 100,
               alpha: float = 0.85,
               weight: bool = False,
               similarity_func: Callable[[str, str], float] = None,
               tokenizer: Callable[[str], List[str]] = lambda s: s.split(),
               word_min_len: int = 2,
-              stopwords: str = None) -> List[Union[str, Tuple[str, float]]]:
+              stopwords: str = None,
+              tol: float = 1e-6) -> List[Union[str, Tuple[str, float]]]:
     """TextRank提取关键句的简单实现
 
+    只计算至少有一个公共词的句子对的相似度，其余句子对视为不相连
+
     :param texts: 句子列表
     :param top_n: 选取前几句
-    :param n_iter: 迭代次数
+    :param n_iter: 最大迭代次数
     :param alpha: 平滑系数
     :param weight: 是否返回句子分数
-    :param similarity_func: 相似度函数
+    :param similarity_func: 相似度函数，默认为公共词数除以两个句子长度的对数之和
     :param tokenizer: 分词器
     :param word_min_len: 最短单词长度
     :param stopwords:  停用词文件路径，默认使用内置停用词
+    :param tol: 两次迭代分数的最大变化量小于该值时停止
     """
-    if similarity_func is None:
-        similarity_func = _similarity_func
     tokenized_texts = get_tokenized_words(texts, tokenizer, word_min_len, stopwords)
-    nodes = {}
-    similarities = {}
-    for i, words_i in enumerate(tokenized_texts):
-        j = i + 1
-        while j < len(texts):
-            words_j = tokenized_texts[j]
-            similarity = similarity_func(words_i, words_j)
-            if similarity > 0:
-                if i not in nodes:
-                    nodes[i] = set()
-                if j not in nodes:
-                    nodes[j] = set()
-                nodes[i].add(j)
-                nodes[j].add(i)
-                similarities[(i, j)] = similarity
-            j += 1
-
-    values = {}
-    for _ in range(n_iter):
-        for i, links in nodes.items():
-            val = 1 - alpha
-            for j in links:
-                similarity = similarities[(i, j)] if i < j else similarities[(j, i)]
-                val += alpha * (similarity / len(nodes[j])) * values.get(j, 1 / len(nodes))
-            values[i] = val
-
-    return [(texts[item[0]], item[1]) if weight else texts[item[0]] for item in
-            heapq.nlargest(top_n, values.items(), key=lambda x: x[1])]
+    rows, cols, shared = _shared_word_pairs(tokenized_texts)
+    if similarity_func is None or similarity_func is _similarity_func:
+        # 默认相似度直接由公共词数向量化计算，两个句子都只有一个词时为0
+        lengths = np.array([len(words) for words in tokenized_texts], np.float64)
+        denominator = np.log(lengths[rows]) + np.log(lengths[cols])
+        similarities = np.divide(shared, denominator,
+                                 out=np.zeros(len(shared)), where=denominator > 0)
+    else:
+        similarities = np.array([similarity_func(tokenized_texts[i], tokenized_texts[j])
+                                 for i, j in zip(rows.tolist(), cols.tolist())], np.float64)
+    positive = similarities > 0
+    rows, cols, similarities = rows[positive], cols[positive], similarities[positive]
+
+    # 只有存在边的句子参与迭代
+    nodes = np.unique(np.concatenate([rows, cols]))
+    if len(nodes) == 0:
+        return []
+    rows, cols = np.searchsorted(nodes, rows), np.searchsorted(nodes, cols)
+    matrix = csr_matrix((np.concatenate([similarities, similarities]),
+                         (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+                        shape=(len(nodes), len(nodes)))
+    values = _power_iteration(matrix, alpha, n_iter, tol)
+
+    top = heapq.nlargest(top_n, range(len(nodes)), key=values.__getitem__)
+    return [(texts[nodes[i]], float(values[i])) if weight else texts[nodes[i]] for i in top]
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# @Author  : uhauha2929
+# @Email   : ck143302@gmail.com
+import math
+from collections import Counter
+from typing import List, Iterable, Callable, Tuple
+
+import numpy as np
+
+from .common import iter_tokenized_words
+
+
+def _compress(values: np.ndarray) -> np.ndarray:
+    """用能容纳最大值的最小无符号整数类型存储"""
+    max_value = int(values.max(initial=0))
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values.astype(np.uint64)
+
+
+def _merge_scores(ids1: np.ndarray, scores1: np.ndarray,
+                  ids2: np.ndarray, scores2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """合并两组递增的文档编号，相同文档的分数相加"""
+    if len(ids1) == 0 or len(ids2) == 0:
+        return (ids2, scores2) if len(ids1) == 0 else (ids1, scores1)
+    low = min(ids1[0], ids2[0])
+    span = max(ids1[-1], ids2[-1]) + 1 - low
+    if span <= 8 * (len(ids1) + len(ids2)):
+        # 文档编号密集时在编号范围内直接累加
+        totals = np.zeros(span)
+        present = np.zeros(span, bool)
+        totals[ids1 - low] = scores1
+        totals[ids2 - low] += scores2
+        present[ids1 - low] = True
+        present[ids2 - low] = True
+        offsets = np.flatnonzero(present)
+        return offsets + low, totals[offsets]
+    # 稀疏时在第一组中二分查找，已有的累加分数，新的文档按顺序插入
+    positions = np.searchsorted(ids1, ids2)
+    found = positions < len(ids1)
+    found[found] = ids1[positions[found]] == ids2[found]
+    scores1 = scores1.copy()
+    scores1[positions[found]] += scores2[found]
+    new = ~found
+    return (np.insert(ids1, positions[new], ids2[new]),
+            np.insert(scores1, positions[new], scores2[new]))
+
+
+class InvertedIndex(object):
+    # 倒排表每块的文档数，只与候选文档比较时按块解码，跳过不含候选文档的块
+    BLOCK_SIZE = 128
+
+    def __init__(self,
+                 tokenizer: Callable[[str], List[str]] = str.split,
+                 word_min_len: int = 2,
+                 stopwords: str = None,
+                 k1: float = 1.5,
+                 b: float = 0.75):
+        """倒排索引检索，支持BM25和tfidf打分，用MaxScore剪枝返回前k个文档
+
+        每个词的倒排表是文档编号的差值和词频两个NumPy数组，用最小的整数类型压缩，
+        并记录每BLOCK_SIZE个文档一块的第一个文档编号；
+        新增的文档先放在缓冲区中，查询或保存前追加到倒排表末尾
+
+        :param tokenizer: 分词器，与text.common.get_tokenized_words一致
+        :param word_min_len: 单词的最小长度
+        :param stopwords: 停用词文件路径，默认使用内置停用词
+        :param k1: BM25的词频饱和参数
+        :param b: BM25的文档长度归一化参数
+        """
+        self.tokenizer = tokenizer
+        self.word_min_len = word_min_len
+        self.stopwords = stopwords
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        # 每个词的倒排表：(文档编号差值, 词频, 每块的第一个文档编号)
+        self.postings = []
+        # 每个词的最大词频、最短文档长度和最大的词频/文档长度，用于计算分数上界
+        self.max_tf = []
+        self.min_len = []
+        self.max_ratio = []
+        self.doc_lens = np.zeros(0, np.int64)
+        self._pending = {}
+        self._pending_lens = []
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lens) + len(self._pending_lens)
+
+    def _tokenize(self, docs: Iterable[str]) -> Iterable[List[str]]:
+        return iter_tokenized_words(docs, self.tokenizer, self.word_min_len, self.stopwords)
+
+    def _new_term(self, word: str) -> int:
+        term = self.vocabulary[word] = len(self.vocabulary)
+        self.postings.append((np.zeros(0, np.uint8), np.zeros(0, np.uint8), np.zeros(0, np.int64)))
+        self.max_tf.append(0)
+        self.min_len.append(math.inf)
+        self.max_ratio.append(0.0)
+        return term
+
+    def add(self, docs: Iterable[str]) -> range:
+        """添加文档，返回分配的文档编号"""
+        start = self.n_docs
+        for words in self._tokenize(docs):
+            doc_id = self.n_docs
+            doc_len = len(words)
+            self._pending_lens.append(doc_len)
+            for word, tf in Counter(words).items():
+                term = self.vocabulary.get(word)
+                if term is None:
+                    term = self._new_term(word)
+                self._pending.setdefault(term, ([], []))
+                self._pending[term][0].append(doc_id)
+                self._pending[term][1].append(tf)
+                self.max_tf[term] = max(self.max_tf[term], tf)
+                self.min_len[term] = min(self.min_len[term], doc_len)
+                self.max_ratio[term] = max(self.max_ratio[term], tf / doc_len)
+        return range(start, self.n_docs)
+
+    def _append_postings(self, term: int, doc_ids: np.ndarray, tfs: np.ndarray):
+        """在倒排表末尾追加递增的文档编号及其词频"""
+        gaps, old_tfs, firsts = self.postings[term]
+        start = len(gaps)
+        # 第一个差值为0，文档编号由每块的第一个文档编号恢复
+        if start:
+            last = self._decode_blocks(term, np.array([len(firsts) - 1]))[0][-1]
+        else:
+            last = doc_ids[0]
+        # 新的块从整个倒排表中下标为BLOCK_SIZE倍数的位置开始
+        block_starts = np.arange(-start % self.BLOCK_SIZE, len(doc_ids), self.BLOCK_SIZE)
+        self.postings[term] = (
+            _compress(np.concatenate([gaps.astype(np.int64), np.diff(doc_ids, prepend=last)])),
+            _compress(np.concatenate([old_tfs.astype(np.int64), tfs])),
+            np.concatenate([firsts, doc_ids[block_starts]]))
+
+    def commit(self):
+        """将缓冲区中的文档写入压缩的倒排表"""
+        for term, (doc_ids, tfs) in self._pending.items():
+            self._append_postings(term, np.asarray(doc_ids, np.int64), np.asarray(tfs, np.int64))
+        if self._pending_lens:
+            self.doc_lens = np.concatenate([self.doc_lens, np.asarray(self._pending_lens, np.int64)])
+        self._pending = {}
+        self._pending_lens = []
+
+    def _decode(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回某个词的文档编号和词频数组"""
+        gaps, tfs, firsts = self.postings[term]
+        return firsts[0] + np.cumsum(gaps, dtype=np.int64), tfs.astype(np.int64)
+
+    def _decode_blocks(self, term: int, blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """只解码指定的块（按块号递增），返回这些块的文档编号和词频数组"""
+        gaps, tfs, firsts = self.postings[term]
+        starts = blocks * self.BLOCK_SIZE
+        lengths = np.minimum(starts + self.BLOCK_SIZE, len(gaps)) - starts
+        offsets = np.cumsum(lengths) - lengths
+        # 所选位置在整个倒排表中的下标
+        index = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        values = gaps[index].astype(np.int64)
+        # 每块内单独求前缀和，块的开头为记录的第一个文档编号
+        values[offsets] = 0
+        cumulative = np.cumsum(values)
+        doc_ids = cumulative + np.repeat(firsts[blocks] - cumulative[offsets], lengths)
+        return doc_ids, tfs[index].astype(np.int64)
+
+    def _probe(self, term: int, doc_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """在倒排表中查找递增的文档编号，返回其中出现的下标和对应的词频"""
+        firsts = self.postings[term][2]
+        blocks = np.searchsorted(firsts, doc_ids, 'right') - 1
+        blocks = blocks[blocks >= 0]
+        # 块号递增，去重只需比较相邻元素
+        blocks = blocks[np.concatenate(([True], blocks[1:] != blocks[:-1]))] if len(blocks) else blocks
+        if len(blocks) == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        if len(blocks) == len(firsts):
+            ids, tfs = self._decode(term)
+        else:
+            ids, tfs = self._decode_blocks(term, blocks)
+        low = ids[0]
+        span = ids[-1] + 1 - low
+        if span <= 8 * (len(ids) + len(doc_ids)):
+            # 文档编号密集时用编号范围内的查找表代替二分查找
+            table = np.full(span + 1, -1, np.int64)
+            table[ids - low] = np.arange(len(ids))
+            positions = table[np.clip(doc_ids - low, -1, span)]
+        else:
+            positions = np.minimum(np.searchsorted(ids, doc_ids), len(ids) - 1)
+            positions[ids[positions] != doc_ids] = -1
+        hits = np.flatnonzero(positions >= 0)
+        return hits, tfs[positions[hits]]
+
+    def _doc_freq(self, term: int) -> int:
+        return len(self.postings[term][0])
+
+    def _term_scorer(self, term: int, scoring: str, avg_len: float):
+        """返回某个词的打分函数、分数上界和分数下界（不出现时分数为0，所以上界不小于0、下界不大于0）"""
+        n_docs = len(self.doc_lens)
+        df = self._doc_freq(term)
+        if scoring == 'bm25':
+            idf = math.log((n_docs - df + 0.5) / (df + 0.5) + 1)
+            k1, b = self.k1, self.b
+
+            def score(tfs, lens):
+                return idf * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lens / avg_len))
+
+            # 词频越大、文档越短分数越高
+            tf = self.max_tf[term]
+            upper = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * self.min_len[term] / avg_len))
+            lower = 0.0
+        elif scoring == 'tfidf':
+            idf = math.log(n_docs / (1 + df))
+
+            def score(tfs, lens):
+                return idf * tfs / lens
+
+            # 出现在几乎所有文档中的词idf为负，出现反而会降低分数
+            upper = max(0.0, idf * self.max_ratio[term])
+            lower = min(0.0, idf * self.max_ratio[term])
+        else:
+            raise ValueError(f'Unsupported scoring: {scoring}')
+        return score, upper, lower
+
+    def search(self, query: str, k: int = 10, scoring: str = 'bm25') -> List[Tuple[int, float]]:
+        """返回与查询最相关的k个文档
+
+        按分数上界从大到小逐个处理查询词（MaxScore）：剩余词的上界之和小于当前第k大的分数后，
+        未出现过的文档不可能进入前k，之后的词只在倒排表中按块查找已有的候选；
+        候选加上剩余上界仍达不到第k大的分数也被剪掉。候选用递增的文档编号和分数两个数组表示。
+        剪枝要求之后的词不会降低分数，有词的分数可能为负（tfidf中idf为负）时不剪枝
+
+        :param query: 查询语句
+        :param k: 返回的文档数
+        :param scoring: 'bm25'或'tfidf'
+        :return: (文档编号, 分数)列表，按分数由大到小排序
+        """
+        if self._pending:
+            self.commit()
+        words = next(iter(self._tokenize([query])))
+        terms = Counter(self.vocabulary[w] for w in words if w in self.vocabulary)
+        if not terms or k <= 0:
+            return []
+
+        avg_len = self.doc_lens.mean()
+        scorers = []
+        prune = True
+        for term, count in terms.items():
+            score, upper, lower = self._term_scorer(term, scoring, avg_len)
+            scorers.append((upper * count, count, term, score))
+            prune = prune and lower >= 0
+        scorers.sort(key=lambda x: -x[0])
+
+        cand_ids = np.zeros(0, np.int64)
+        cand_scores = np.zeros(0)
+        threshold = -math.inf
+        for i, (upper, count, term, score) in enumerate(scorers):
+            # 剩余查询词的分数上界之和
+            remaining = sum(s[0] for s in scorers[i + 1:])
+            if upper + remaining >= threshold:
+                doc_ids, tfs = self._decode(term)
+                term_scores = count * score(tfs, self.doc_lens[doc_ids])
+                cand_ids, cand_scores = _merge_scores(cand_ids, cand_scores, doc_ids, term_scores)
+            else:
+                hits, tfs = self._probe(term, cand_ids)
+                cand_scores[hits] += count * score(tfs, self.doc_lens[cand_ids[hits]])
+
+            if prune and len(cand_ids) >= k:
+                threshold = np.partition(cand_scores, len(cand_ids) - k)[len(cand_ids) - k]
+                keep = cand_scores + remaining >= threshold
+                cand_ids, cand_scores = cand_ids[keep], cand_scores[keep]
+
+        if len(cand_ids) > k:
+            top = np.argpartition(-cand_scores, k - 1)[:k]
+            cand_ids, cand_scores = cand_ids[top], cand_scores[top]
+        order = np.lexsort((cand_ids, -cand_scores))
+        return [(int(cand_ids[i]), float(cand_scores[i])) for i in order]
+
+    def save(self, path: str):
+        """保存索引为npz文件"""
+        self.commit()
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        decoded = [self._decode(term) for term in range(len(terms))]
+        offsets = np.zeros(len(terms) + 1, np.int64)
+        np.cumsum([len(ids) for ids, _ in decoded], out=offsets[1:])
+        np.savez_compressed(
+            path,
+            terms=np.array(terms, dtype=str),
+            offsets=offsets,
+            doc_ids=np.concatenate([ids for ids, _ in decoded] or [np.zeros(0, np.int64)]),
+            tfs=np.concatenate([tfs for _, tfs in decoded] or [np.zeros(0, np.int64)]),
+            doc_lens=self.doc_lens,
+            params=np.array([self.word_min_len, self.k1, self.b]),
+            stopwords=np.array(self.stopwords or ''))
+
+    @classmethod
+    def load(cls, path: str,
+             tokenizer: Callable[[str], List[str]] = str.split) -> 'InvertedIndex':
+        """加载保存的索引（分词器需要重新指定）"""
+        with np.load(path) as data:
+            word_min_len, k1, b = data['params'].tolist()
+            stopwords = str(data['stopwords']) or None
+            index = cls(tokenizer, int(word_min_len), stopwords, k1, b)
+            index.doc_lens = data['doc_lens'].astype(np.int64)
+            offsets, doc_ids, tfs = data['offsets'], data['doc_ids'], data['tfs']
+            for term, word in enumerate(data['terms'].tolist()):
+                ids = doc_ids[offsets[term]:offsets[term + 1]].astype(np.int64)
+                term_tfs = tfs[offsets[term]:offsets[term + 1]].astype(np.int64)
+                lens = index.doc_lens[ids]
+                index._new_term(word)
+                index._append_postings(term, ids, term_tfs)
+                index.max_tf[term] = int(term_tfs.max())
+                index.min_len[term] = int(lens.min())
+                index.max_ratio[term] = float((term_tfs / lens).max())
+        return index
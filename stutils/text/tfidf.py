@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 # @Author  : uhauha2929
 # @Email   : ck143302@gmail.com
+import json
 import math
 import warnings
-from typing import List, Callable, Dict
+import zlib
+from typing import List, Callable, Dict, Iterable, Iterator
 
-from .common import get_tokenized_words
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+from .common import get_tokenized_words, iter_tokenized_words
 
 
 def get_idf(texts: List[List[str]]) -> Dict[str, float]:
@@ -50,3 +55,175 @@ def get_tfidf(docs: List[str],
             tfidf[word] = tfidf[word] / len(words) * idf.get(word, 0)
         result.append(tfidf)
     return result
+
+
+class TfidfVectorizer(object):
+
+    def __init__(self,
+                 tokenizer: Callable[[str], List[str]] = str.split,
+                 word_min_len: int = 2,
+                 stopwords: str = None,
+                 chunk_size: int = 1000,
+                 workers: int = None,
+                 n_bits: int = None):
+        """TF-IDF向量化器，可以分批学习词表和文档频率，并将文档转换为稀疏矩阵
+
+        tf和idf的计算方式与get_tfidf相同：tf为词频除以文档长度，idf为log(N / (1 + df))。
+        指定n_bits时使用哈希技巧，不保存词表，单词由crc32映射到2^n_bits维特征空间，
+        哈希值的最高位决定符号以抵消冲突带来的偏差，内存与语料大小无关
+
+        :param tokenizer: 文档的分词器，默认空格分割，多进程时必须可以被pickle
+        :param word_min_len: 关键词的最小长度
+        :param stopwords: 停用词路径，默认使用内置停用词
+        :param chunk_size: 分词时每块的文档数
+        :param workers: 分词的进程数
+        :param n_bits: 哈希特征空间的位数（1~31），默认使用词表
+        """
+        if n_bits is not None and not 1 <= n_bits <= 31:
+            raise ValueError('n_bits must be in range of 1-31.')
+        self.n_bits = n_bits
+        self.tokenizer = tokenizer
+        self.word_min_len = word_min_len
+        self.stopwords = stopwords
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._reset()
+
+    def _reset(self):
+        self.vocabulary = {}
+        self.df = np.zeros(0 if self.n_bits is None else 1 << self.n_bits, np.int64)
+        self.n_docs = 0
+
+    @property
+    def n_features(self) -> int:
+        return len(self.vocabulary) if self.n_bits is None else 1 << self.n_bits
+
+    def _hash(self, word: str):
+        """返回单词的特征下标和符号"""
+        h = zlib.crc32(word.encode('utf8'))
+        return h & ((1 << self.n_bits) - 1), -1 if h >> 31 else 1
+
+    def _iter_batches(self, docs: Iterable[str]) -> Iterator[List[List[str]]]:
+        return iter_tokenized_words(docs, self.tokenizer, self.word_min_len, self.stopwords,
+                                    chunk_size=self.chunk_size, workers=self.workers,
+                                    batched=True)
+
+    def _fit_texts(self, texts: List[List[str]]):
+        vocabulary = self.vocabulary
+        indices = []
+        for words in texts:
+            if self.n_bits is not None:
+                indices.extend({self._hash(word)[0] for word in words})
+                continue
+            for word in set(words):
+                index = vocabulary.get(word)
+                if index is None:
+                    index = vocabulary[word] = len(vocabulary)
+                indices.append(index)
+        counts = np.bincount(np.asarray(indices, np.int64), minlength=self.n_features)
+        counts[:len(self.df)] += self.df
+        self.df = counts
+        self.n_docs += len(texts)
+
+    def _transform_texts(self, texts: List[List[str]], idf: np.ndarray) -> csr_matrix:
+        vocabulary = self.vocabulary
+        indptr = [0]
+        indices = []
+        data = []
+        for words in texts:
+            counts = {}
+            for word in words:
+                if self.n_bits is not None:
+                    index, sign = self._hash(word)
+                    counts[index] = counts.get(index, 0) + sign
+                    continue
+                index = vocabulary.get(word)
+                if index is not None:
+                    counts[index] = counts.get(index, 0) + 1
+            indices.extend(counts)
+            data.extend(count / len(words) for count in counts.values())
+            indptr.append(len(indices))
+        indices = np.asarray(indices, np.int64)
+        data = np.asarray(data, np.float64) * idf[indices]
+        return csr_matrix((data, indices, np.asarray(indptr, np.int64)),
+                          shape=(len(texts), self.n_features))
+
+    def partial_fit(self, docs: Iterable[str]) -> 'TfidfVectorizer':
+        """用一批文档更新词表和文档频率"""
+        for texts in self._iter_batches(docs):
+            self._fit_texts(texts)
+        return self
+
+    def fit(self, docs: Iterable[str]) -> 'TfidfVectorizer':
+        """重新学习词表和文档频率"""
+        self._reset()
+        return self.partial_fit(docs)
+
+    def idf(self) -> np.ndarray:
+        """返回每个词的idf值，下标与词表一致"""
+        if self.n_docs == 0:
+            raise RuntimeError('Please fit the vectorizer first.')
+        return np.log(self.n_docs / (1 + self.df))
+
+    def transform(self, docs: Iterable[str]) -> csr_matrix:
+        """将文档转换为tfidf稀疏矩阵，每行一篇文档，不在词表中的词被忽略"""
+        idf = self.idf()
+        blocks = [self._transform_texts(texts, idf) for texts in self._iter_batches(docs)]
+        if not blocks:
+            return csr_matrix((0, self.n_features))
+        return vstack(blocks, format='csr')
+
+    def fit_transform(self, docs: Iterable[str]) -> csr_matrix:
+        """学习并转换同一批文档，文档只分词一次"""
+        self._reset()
+        texts = [words for batch in self._iter_batches(docs) for words in batch]
+        self._fit_texts(texts)
+        return self._transform_texts(texts, self.idf())
+
+    def merge(self, other: 'TfidfVectorizer') -> 'TfidfVectorizer':
+        """合并另一个向量化器（例如其他进程）学习到的文档频率"""
+        if self.n_bits != other.n_bits:
+            raise ValueError('Cannot merge vectorizers with different n_bits.')
+        if self.n_bits is None:
+            # 按词将对方的列映射到自己的词表中
+            for word in other.get_feature_names():
+                self.vocabulary.setdefault(word, len(self.vocabulary))
+            df = np.zeros(len(self.vocabulary), np.int64)
+            df[:len(self.df)] = self.df
+            np.add.at(df, [self.vocabulary[word] for word in other.get_feature_names()], other.df)
+            self.df = df
+        else:
+            self.df = self.df + other.df
+        self.n_docs += other.n_docs
+        return self
+
+    def get_feature_names(self) -> List[str]:
+        """返回按列下标排序的词"""
+        if self.n_bits is not None:
+            raise ValueError('Feature names are not available in hashing mode.')
+        return sorted(self.vocabulary, key=self.vocabulary.get)
+
+    def save(self, path: str):
+        """保存学习到的词表和文档频率（分词器需要在加载时重新指定）"""
+        with open(path, 'wt', encoding='utf8') as f:
+            json.dump({'word_min_len': self.word_min_len,
+                       'stopwords': self.stopwords,
+                       'n_bits': self.n_bits,
+                       'n_docs': self.n_docs,
+                       'vocabulary': [] if self.n_bits is not None else self.get_feature_names(),
+                       'df': self.df.tolist()}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str,
+             tokenizer: Callable[[str], List[str]] = str.split,
+             chunk_size: int = 1000,
+             workers: int = None) -> 'TfidfVectorizer':
+        """加载保存的向量化器"""
+        with open(path, 'rt', encoding='utf8') as f:
+            state = json.load(f)
+        vectorizer = cls(tokenizer, state['word_min_len'], state['stopwords'],
+                         chunk_size, workers, state.get('n_bits'))
+        vectorizer.vocabulary = {word: i for i, word in enumerate(state['vocabulary'])}
+        vectorizer.df = np.asarray(state['df'], np.int64)
+        vectorizer.n_docs = state['n_docs']
+        return vectorizer
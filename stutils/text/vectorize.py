@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# @Author  : uhauha2929
+# @Email   : ck143302@gmail.com
+from collections import Counter
+from typing import List, Iterable, Tuple, Dict
+
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+
+class CountVectorizer(object):
+
+    def __init__(self, unique: bool = True, vocabulary: Dict[str, int] = None):
+        """将分好词的文本映射为共享词表上的稀疏行向量
+
+        :param unique: 是否只统计元素的存在性，与cosine_similarity一致
+        :param vocabulary: 已有的词表，键为词，值为列下标
+        """
+        self.unique = unique
+        self.vocabulary = dict(vocabulary) if vocabulary else {}
+
+    def _encode(self, texts: Iterable[List[str]], grow: bool) -> csr_matrix:
+        vocabulary = self.vocabulary
+        indptr = [0]
+        indices = []
+        data = []
+        for words in texts:
+            counts = Counter(words)
+            for word, count in counts.items():
+                index = vocabulary.get(word)
+                if index is None:
+                    if not grow:
+                        continue
+                    index = vocabulary[word] = len(vocabulary)
+                indices.append(index)
+                data.append(1 if self.unique else count)
+            indptr.append(len(indices))
+        return csr_matrix((np.asarray(data, np.float64),
+                           np.asarray(indices, np.int64),
+                           np.asarray(indptr, np.int64)),
+                          shape=(len(indptr) - 1, len(vocabulary)))
+
+    def fit(self, texts: Iterable[List[str]]) -> 'CountVectorizer':
+        """将文本中的新词加入词表"""
+        for words in texts:
+            for word in words:
+                if word not in self.vocabulary:
+                    self.vocabulary[word] = len(self.vocabulary)
+        return self
+
+    def transform(self, texts: Iterable[List[str]]) -> csr_matrix:
+        """转换成CSR矩阵，每行一个文本，不在词表中的词被忽略"""
+        return self._encode(texts, grow=False)
+
+    def fit_transform(self, texts: Iterable[List[str]]) -> csr_matrix:
+        """更新词表并转换，只遍历一次文本"""
+        return self._encode(texts, grow=True)
+
+
+def normalize_rows(matrix: csr_matrix) -> csr_matrix:
+    """将稀疏矩阵的每一行归一化为单位向量，全零行保持不变"""
+    matrix = csr_matrix(matrix, dtype=np.float64)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return diags(1 / norms) @ matrix
+
+
+def _align_columns(matrix: csr_matrix, n_cols: int) -> csr_matrix:
+    """词表增长后，之前转换的矩阵列数较少，补齐为相同列数（n_cols不小于矩阵列数）"""
+    if matrix.shape[1] == n_cols:
+        return matrix
+    return csr_matrix((matrix.data, matrix.indices, matrix.indptr),
+                      shape=(matrix.shape[0], n_cols))
+
+
+def cosine_top_k(query_rows: csr_matrix,
+                 corpus_matrix: csr_matrix,
+                 k: int = 10,
+                 block_size: int = 1024) -> List[List[Tuple[int, float]]]:
+    """返回每个查询在语料中余弦相似度最高的k个文档
+
+    行向量归一化后，相似度即为稀疏矩阵乘积，按查询分块计算以控制内存
+
+    :param query_rows: 查询的稀疏行向量，与语料使用同一个词表
+    :param corpus_matrix: 语料的稀疏矩阵，每行一个文档
+    :param k: 每个查询返回的文档数
+    :param block_size: 每次一起计算的查询数
+    :return: 每个查询的(文档下标, 相似度)列表，按相似度由大到小排序，只包含相似度大于0的文档
+    """
+    n_cols = max(query_rows.shape[1], corpus_matrix.shape[1])
+    queries = normalize_rows(_align_columns(csr_matrix(query_rows), n_cols))
+    corpus_t = normalize_rows(_align_columns(csr_matrix(corpus_matrix), n_cols)).T.tocsr()
+    results = []
+    for start in range(0, queries.shape[0], block_size):
+        scores = (queries[start:start + block_size] @ corpus_t).tocsr()
+        for i in range(scores.shape[0]):
+            row = scores[i]
+            data, indices = row.data, row.indices
+            if len(data) > k:
+                top = np.argpartition(-data, k - 1)[:k]
+                data, indices = data[top], indices[top]
+            order = np.lexsort((indices, -data))
+            results.append([(int(indices[j]), float(data[j])) for j in order if data[j] > 0])
+    return results
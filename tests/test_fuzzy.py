@@ -0,0 +1,38 @@
+from stutils.string.fuzzy import BKTree
+
+
+def test_bktree_load_save_load(tmp_path):
+    word_file = tmp_path / 'words.txt'
+    word_file.write_text('hello\nhelp\nhell\nworld\nword\n', encoding='utf8')
+    tree = BKTree(save_dir=str(tmp_path))
+    tree.build(str(word_file))
+    expected = tree.query('helo', top_n=5, tol=1)
+
+    loaded = BKTree(save_dir=str(tmp_path))
+    loaded.load()
+    # 覆盖正被内存映射的文件
+    loaded.save()
+    assert loaded.query('helo', top_n=5, tol=1) == expected
+
+    reloaded = BKTree(save_dir=str(tmp_path))
+    reloaded.load()
+    assert reloaded.query('helo', top_n=5, tol=1) == expected
+    assert reloaded.count() == tree.count()
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == '.tmp'] == []
+
+
+def test_bktree_add_keeps_rank_of_existing_word(tmp_path):
+    word_file = tmp_path / 'words.txt'
+    word_file.write_text('hello\nhelp\nhell\n', encoding='utf8')
+    tree = BKTree(save_dir=str(tmp_path))
+    tree.build(str(word_file))
+    expected = tree.query('helo', top_n=3, tol=1)
+
+    tree.add('hello')
+    assert tree.query('helo', top_n=3, tol=1) == expected
+
+    tree.remove('hello')
+    assert 'hello' not in tree.query('helo', top_n=3, tol=1)
+    tree.add('hello')
+    assert tree.query('helo', top_n=3, tol=1)[-1] == 'hello'
+    assert tree.count() == 3
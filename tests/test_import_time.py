@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+# 导入stutils和轻量模块的时间上限（微秒），加载NumPy、SciPy时会远超这个值
+IMPORT_BUDGET_US = 150_000
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_profile(statement: str):
+    """在新的解释器中执行导入语句，返回-X importtime的报告和加载的重量级依赖"""
+    code = (f'{statement}; import sys; '
+            'print(sorted({m.split(".")[0] for m in sys.modules} & {"numpy", "scipy"}))')
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+    return result.stderr, result.stdout.strip()
+
+
+def _cumulative_time(report: str) -> int:
+    """累加第一个stutils模块之后所有顶层导入的累计时间（微秒）"""
+    total, started = 0, False
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        started = started or name.strip().startswith('stutils')
+        # 只统计顶层导入，嵌套导入已经包含在累计时间中
+        if started and not name[1:].startswith(' '):
+            total += int(cumulative)
+    return total
+
+
+def test_light_import_does_not_load_numpy_or_scipy():
+    report, heavy = _import_profile('import stutils, stutils.string.conversion')
+    assert heavy == '[]'
+    assert _cumulative_time(report) < IMPORT_BUDGET_US
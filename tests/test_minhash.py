@@ -0,0 +1,13 @@
+from stutils.hash.minhash import MinHash, MinHashLSH
+
+
+def test_short_documents_are_not_duplicates():
+    minhash = MinHash()
+    signatures = minhash.signatures(['', 'a', 'ab', 'hello world', 'hello world!'])
+    lsh = MinHashLSH(threshold=0.5)
+    for key, signature in enumerate(signatures):
+        lsh.insert(key, signature)
+    assert [(k1, k2) for k1, k2, _ in lsh.find_all_pairs()] == [(3, 4)]
+    assert lsh.query(signatures[0]) == []
+    assert MinHash.jaccard(signatures[0], signatures[1]) == 0
+    assert lsh.remove(0)
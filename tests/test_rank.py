@@ -0,0 +1,17 @@
+from stutils.text.rank import text_rank, word_rank
+
+
+def test_word_rank_without_edges():
+    doc = ['quick brown fox jumps', 'lazy brown dog']
+    keywords = word_rank(doc, window_size=1, weight=True)
+    assert {w for w, _ in keywords} == {'quick', 'brown', 'fox', 'jumps', 'lazy', 'dog'}
+    assert all(abs(score - 0.15) < 1e-12 for _, score in keywords)
+
+
+def test_text_rank_converges_with_large_weights():
+    texts = ['alpha beta', 'alpha beta', 'beta gamma']
+    ranked = text_rank(texts, weight=True,
+                       similarity_func=lambda a, b: len(set(a) & set(b)))
+    # 加权PageRank的分数之和等于结点数
+    assert abs(sum(score for _, score in ranked) - len(texts)) < 1e-4
+    assert all(score < len(texts) for _, score in ranked)
@@ -0,0 +1,75 @@
+import math
+import random
+from collections import Counter
+
+from stutils.text.search import InvertedIndex
+
+
+def _brute_force_bm25(docs, query, k, k1=1.5, b=0.75):
+    tokenized = [doc.split() for doc in docs]
+    avg_len = sum(map(len, tokenized)) / len(tokenized)
+    df = Counter(w for words in tokenized for w in set(words))
+    scores = []
+    for doc_id, words in enumerate(tokenized):
+        tf = Counter(words)
+        score = 0.0
+        for word, count in Counter(query.split()).items():
+            if tf[word]:
+                idf = math.log((len(docs) - df[word] + 0.5) / (df[word] + 0.5) + 1)
+                norm = k1 * (1 - b + b * len(words) / avg_len)
+                score += count * idf * tf[word] * (k1 + 1) / (tf[word] + norm)
+        if score > 0:
+            scores.append((-score, doc_id))
+    return [doc_id for _, doc_id in sorted(scores)[:k]]
+
+
+def test_search_matches_brute_force(tmp_path):
+    rng = random.Random(0)
+    vocab = [f'w{i}' for i in range(50)]
+    weights = [1 / (i + 1) for i in range(50)]
+    docs = [' '.join(rng.choices(vocab, weights, k=rng.randint(3, 12))) for _ in range(600)]
+    index = InvertedIndex(stopwords=None)
+    # 小的块和多次提交，覆盖按块查找和追加倒排表
+    index.BLOCK_SIZE = 7
+    for start in range(0, len(docs), 250):
+        index.add(docs[start:start + 250])
+        index.commit()
+    path = str(tmp_path / 'index.npz')
+    index.save(path)
+    loaded = InvertedIndex.load(path)
+    for query in ('w0 w1 w2', 'w3 w30 w45', 'w1 w1 w7', 'w49', 'w2 w5 w8 w13 w21'):
+        expected = _brute_force_bm25(docs, query, 10)
+        assert [doc_id for doc_id, _ in index.search(query, 10)] == expected
+        assert [doc_id for doc_id, _ in loaded.search(query, 10)] == expected
+
+
+def _brute_force_tfidf(docs, query):
+    tokenized = [doc.split() for doc in docs]
+    df = Counter(w for words in tokenized for w in set(words))
+    scores = {}
+    for doc_id, words in enumerate(tokenized):
+        tf = Counter(words)
+        if any(tf[word] for word in query.split()):
+            scores[doc_id] = sum(count * math.log(len(docs) / (1 + df[word])) * tf[word] / len(words)
+                                 for word, count in Counter(query.split()).items())
+    return scores
+
+
+def test_tfidf_search_with_negative_idf():
+    docs = ['alpha common common', 'alpha common xx yy zz ww', 'common qq', 'common rr']
+    index = InvertedIndex(stopwords=None)
+    index.add(docs)
+    assert [doc_id for doc_id, _ in index.search('alpha common', 1, 'tfidf')] == [1]
+
+    rng = random.Random(1)
+    vocab = [f'w{i}' for i in range(30)]
+    docs = [' '.join(['ubiquity'] + rng.choices(vocab, k=rng.randint(2, 10))) for _ in range(300)]
+    index = InvertedIndex(stopwords=None)
+    index.add(docs)
+    for query in ('w0 ubiquity', 'ubiquity w1 w2', 'w3 w4 w5'):
+        expected = _brute_force_tfidf(docs, query)
+        results = index.search(query, 5, 'tfidf')
+        # 分数相同的文档顺序不确定，只比较分数
+        assert [round(score, 9) for _, score in results] == \
+            sorted((round(score, 9) for score in expected.values()), reverse=True)[:5]
+        assert all(abs(expected[doc_id] - score) < 1e-9 for doc_id, score in results)